@@ -0,0 +1,221 @@
+"""Нагрузочный бенчмарк диспетчера: N пользователей одновременно проходят запись.
+
+Настоящий Dispatcher (user_router + admin_router, middleware, FSM в SQLite) получает
+синтетические апдейты, Telegram заменён FakeSession. Каждый пользователь проходит
+/start → услуга → дата → время → кличка → телефон → комментарий, затем
+«Мои заявки» и FAQ. Дата и время у каждого свои (по id пользователя), чтобы все
+дошли до заявки; уровень, где записались не все, считается сорванным. На каждом
+уровне конкурентности — апдейты/с, p50/p99 времени обработки апдейта и SQL-запросов
+на апдейт (всего и по хендлерам).
+
+Запуск из корня проекта:
+    python bench/booking_bench.py [--levels 1 10 100] [--out bench/results/booking.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DB_DIR = tempfile.mkdtemp(prefix="booking_bench_")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{DB_DIR}/bench.db"
+os.environ["ADMIN_IDS"] = "1"
+os.environ.setdefault("BOT_TOKEN", "0:bench")
+
+import aiogram  # noqa: E402
+from aiogram.methods import SendMessage  # noqa: E402
+import sqlalchemy  # noqa: E402
+
+import main  # noqa: E402
+from database import init_db  # noqa: E402
+from config import SLOT_DAYS_AHEAD  # noqa: E402
+from utils.catalog import catalog  # noqa: E402
+from utils.metrics import track  # noqa: E402
+from utils.outbox import outbox  # noqa: E402
+from tests.helpers import FakeSession, callback_update, message_update, seed  # noqa: E402
+
+SEED = 1
+FIRST_USER_ID = 2_000_000
+BOOKED_TEXT = "✅ Заявка отправлена"
+SLOT_TAKEN = "⏳ Это время уже заняли"
+SLOT_RETRIES = 5
+
+
+def spread(buttons: list, index: int) -> str:
+    """Кнопка по номеру пользователя: соседние пользователи не спорят за один слот"""
+    return buttons[index % len(buttons)]
+
+
+# Шаг сценария → апдейт для пользователя (кнопки дат и слотов берутся из его последней клавиатуры;
+# день — по uid, время — по uid // числу дней, так пользователи расходятся по разным слотам)
+FLOW = [
+    ("cmd_start", lambda s, uid, rnd: message_update(uid, "/start")),
+    ("book_start", lambda s, uid, rnd: callback_update(uid, "book")),
+    ("book_service", lambda s, uid, rnd: callback_update(uid, f"service:{rnd.choice(list(catalog.services))}")),
+    ("book_day", lambda s, uid, rnd: callback_update(uid, spread(s.buttons("day:", uid), uid))),
+    ("book_slot", lambda s, uid, rnd: callback_update(uid, spread(s.buttons("slot:", uid), uid // SLOT_DAYS_AHEAD))),
+    ("book_pet", lambda s, uid, rnd: message_update(uid, "Бобик")),
+    ("book_phone", lambda s, uid, rnd: message_update(uid, f"+7901{uid % 10_000_000:07d}")),
+    ("book_comment", lambda s, uid, rnd: message_update(uid, "нет")),
+    ("my_requests", lambda s, uid, rnd: callback_update(uid, "my_requests")),
+    ("show_faq_menu", lambda s, uid, rnd: callback_update(uid, "show_faq")),
+    ("faq_answer", lambda s, uid, rnd: callback_update(uid, "faq:price")),
+]
+
+
+def percentile(values: list, q: float) -> float:
+    """Перцентиль по ближайшему рангу"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))]
+
+
+def summarize(latencies: list, queries: list) -> dict:
+    return {
+        "updates": len(latencies),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "queries_per_update": round(statistics.mean(queries), 2),
+        "queries_max": max(queries),
+    }
+
+
+def last_text(session: FakeSession, chat_id: int) -> str:
+    for method in reversed(session.calls):
+        if getattr(method, "chat_id", None) == chat_id and getattr(method, "text", None):
+            return method.text
+    return ""
+
+
+async def user_flow(dp, bot, session: FakeSession, tg_user_id: int, samples: list):
+    rnd = random.Random(tg_user_id)
+
+    async def feed(step: str, update):
+        with track(step) as scope:
+            start = time.perf_counter()
+            await dp.feed_update(bot, update)
+            elapsed = time.perf_counter() - start
+        samples.append((step, elapsed, scope.queries))
+
+    for step, make_update in FLOW:
+        await feed(step, make_update(session, tg_user_id, rnd))
+        # Слот успели занять (клавиатуры соседей сдвинулись) — как живой клиент, берём следующий
+        for attempt in range(1, SLOT_RETRIES + 1):
+            if step != "book_slot" or not last_text(session, tg_user_id).startswith(SLOT_TAKEN):
+                break
+            slot = spread(session.buttons("slot:", tg_user_id), tg_user_id // SLOT_DAYS_AHEAD + attempt)
+            await feed(step, callback_update(tg_user_id, slot))
+
+
+async def run_level(dp, bot, session: FakeSession, users: int, first_user_id: int) -> dict:
+    samples = []
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        user_flow(dp, bot, session, first_user_id + i, samples) for i in range(users)
+    ))
+    wall = time.perf_counter() - start
+
+    booked = sum(
+        1 for method in session.calls
+        if isinstance(method, SendMessage) and first_user_id <= method.chat_id < first_user_id + users
+        and method.text.startswith(BOOKED_TEXT)
+    )
+    if booked != users:
+        # Недошедшие сценарии гоняют хендлеры на неверном вводе — цифры были бы ни о чём
+        raise RuntimeError(f"{users} польз.: заявку оформили только {booked}")
+
+    per_handler = {}
+    for step, elapsed, queries in samples:
+        latencies, counts = per_handler.setdefault(step, ([], []))
+        latencies.append(elapsed)
+        counts.append(queries)
+
+    return {
+        "users": users,
+        "booked": booked,
+        "wall_s": round(wall, 3),
+        "updates_per_s": round(len(samples) / wall, 1),
+        **summarize([s[1] for s in samples], [s[2] for s in samples]),
+        "handlers": {step: summarize(*values) for step, values in per_handler.items()},
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def run(levels: list) -> dict:
+    await init_db()
+    counts = await seed()
+
+    bot = main.create_bot()
+    session = bot.session = FakeSession()
+    dp = main.create_dispatcher()
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+
+    results = []
+    first_user_id = FIRST_USER_ID
+    try:
+        # Прогрев: ленивые кэши (слоты, клавиатуры) не должны попасть в первый уровень
+        await run_level(dp, bot, session, 1, first_user_id - 1)
+        for users in levels:
+            results.append(await run_level(dp, bot, session, users, first_user_id))
+            first_user_id += users  # новые пользователи: лимит записей не срабатывает
+            session.calls.clear()
+        # Ответы уходят через outbox — дожидаемся их до остановки
+        await outbox.join()
+    finally:
+        await dp.emit_shutdown(bot=bot, dispatcher=dp)
+        await dp.fsm.storage.close()
+
+    return {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "aiogram": aiogram.__version__,
+        "sqlalchemy": sqlalchemy.__version__,
+        "seed": {"random": SEED, **counts},
+        "flow": [step for step, _ in FLOW],
+        "levels": results,
+    }
+
+
+def print_report(report: dict):
+    print(f"{'польз.':>6} {'заявок':>6} {'апдейт/с':>9} {'p50, мс':>8} {'p99, мс':>8} {'SQL/апдейт':>11}")
+    for level in report["levels"]:
+        print(
+            f"{level['users']:>6} {level['booked']:>6} {level['updates_per_s']:>9} {level['p50_ms']:>8} "
+            f"{level['p99_ms']:>8} {level['queries_per_update']:>11}"
+        )
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--out", default=os.path.join(ROOT, "bench", "results", "booking.json"))
+    args = parser.parse_args()
+
+    random.seed(SEED)
+    report = asyncio.run(run(args.levels))
+    print_report(report)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Результаты: {args.out}")
+
+
+if __name__ == "__main__":
+    main_cli()
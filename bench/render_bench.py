@@ -0,0 +1,57 @@
+"""Микробенчмарк: сборка клавиатур на каждый апдейт против кэша utils.keyboards.
+
+Запуск из корня проекта: python bench/render_bench.py
+"""
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("BOT_TOKEN", "0:bench")
+
+from utils import keyboards  # noqa: E402
+
+N = 20000
+
+# То, что раньше выполнялось в каждом хендлере
+CASES = {
+    "main_keyboard": keyboards.main_keyboard,
+    "services_keyboard": keyboards.services_keyboard,
+    "faq_menu_keyboard": keyboards.faq_menu_keyboard,
+    "cancel_keyboard": keyboards.cancel_keyboard,
+}
+
+
+def uncached(builder):
+    """Исходная функция-сборщик без кэша"""
+    def build():
+        keyboards.invalidate()
+        return builder()
+    return build
+
+
+def peak_per_call(func) -> int:
+    """Пиковая память одного вызова (байт)"""
+    func()
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    print(f"{'клавиатура':<20} {'сборка, мкс':>12} {'кэш, мкс':>10} {'сборка, Б':>10} {'кэш, Б':>8}")
+    for name, getter in CASES.items():
+        build = uncached(getter)
+        build_us = timeit.timeit(build, number=N) / N * 1e6
+        cached_us = timeit.timeit(getter, number=N) / N * 1e6
+        print(
+            f"{name:<20} {build_us:>12.2f} {cached_us:>10.3f} "
+            f"{peak_per_call(build):>10} {peak_per_call(getter):>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -7,27 +7,116 @@ load_dotenv()
 BOT_TOKEN = os.getenv("BOT_TOKEN", "YOUR_BOT_TOKEN_HERE")
 ADMIN_IDS = list(map(int, os.getenv("ADMIN_IDS", "123456789,987654321").split(",")))
 
+# Режим получения обновлений: "polling" или "webhook"
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL", "")  # https://example.com
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+
+# Процессы: web-панель в WEB_WORKERS воркерах uvicorn, бот — отдельным процессом
+WEB_HOST = os.getenv("WEB_HOST", "0.0.0.0")
+WEB_PORT = int(os.getenv("WEB_PORT", "8000"))
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "2"))
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8081"))  # webhook процесса бота
+
 # Database
-DATABASE_URL = "sqlite+aiosqlite:///./db/database.db"
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./db/database.db")
+DB_BUSY_TIMEOUT_MS = 5000
+DB_MMAP_SIZE = 256 * 1024 * 1024
+DB_CACHE_SIZE_KB = 20000
+DB_READ_POOL_SIZE = 4
+# Повторы записи при "database is locked"
+DB_RETRY_ATTEMPTS = 5
+DB_RETRY_BASE_DELAY = 0.05
 
 # Spam protection (минуты)
-SPAM_TIMEOUT = 3
+SPAM_TIMEOUT = int(os.getenv("SPAM_TIMEOUT", "3"))
+
+# Кэш пользователей (записей, секунды)
+USER_CACHE_SIZE = 10000
+USER_CACHE_TTL = 600
+
+# Буфер логов FAQ: сброс раз в N мс или по M строк
+FAQ_LOG_FLUSH_MS = 500
+FAQ_LOG_BATCH = 100
+
+# Исходящие сообщения Telegram: воркеры, общий лимит (сообщ./с),
+# интервал между сообщениями в один чат (с), попытки доставки
+OUTBOX_WORKERS = 8
+OUTBOX_GLOBAL_RATE = 30
+OUTBOX_CHAT_INTERVAL = 1.0
+OUTBOX_MAX_ATTEMPTS = 5
+
+# FSM: максимум записей в памяти, простой до сброса записи (с), шаг колеса таймеров (с)
+FSM_MAX_ENTRIES = 50000
+FSM_IDLE_TTL = 3600
+FSM_TTL_TICK = 60
+
+# Межпроцессная доставка событий (включает run_server.py для нескольких процессов)
+EVENT_RELAY = os.getenv("EVENT_RELAY", "0") == "1"
+# Опрос таблицы events: 0.5 с после активности, без событий интервал удваивается до 5 с
+# (цена: каждый процесс — SELECT раз в 0.5–5 с; задержка события после простоя — до 5 с)
+EVENT_RELAY_INTERVAL = 0.5  # секунды
+EVENT_RELAY_MAX_INTERVAL = 5.0
+EVENT_RELAY_KEEP = 10000  # сколько последних событий хранить
+
+# Сверка счётчиков статистики с БД (секунды)
+STATS_RECONCILE_INTERVAL = 300
+
+# Напоминания клиентам: за сколько минут до записи, сколько за один проход
+REMINDER_OFFSETS = (24 * 60, 2 * 60)
+REMINDER_BATCH = 50
+
+# Выгрузка заявок: строк CSV за одну порцию, процессов для сборки XLSX,
+# предел строк XLSX (книга собирается целиком в памяти; больше — CSV)
+EXPORT_CSV_CHUNK = 500
+EXPORT_XLSX_WORKERS = 1
+EXPORT_XLSX_MAX_ROWS = 50000
 
-# Services
+# Бюджет SQL на один апдейт бота / HTTP-запрос панели: больше — предупреждение в лог
+QUERY_BUDGET = int(os.getenv("QUERY_BUDGET", "6"))
+SESSION_BUDGET = int(os.getenv("SESSION_BUDGET", "3"))  # соединений из пула
+
+# Как часто сверять версию каталога услуг/FAQ в БД (секунды)
+CATALOG_CHECK_INTERVAL = 30
+
+# Services (начальное наполнение каталога в БД, дальше — через web-панель)
 SERVICES = {
     "wash": "🚿 Мытьё (1000 руб)",
     "cut": "✂️ Стрижка (1500 руб)",
     "full": "💎 Стрижка + мытьё (2200 руб)"
 }
 
-# FAQ (словарь)
+# Длительность услуг (минуты) — начальное наполнение каталога, дальше хранится в нём
+SERVICE_DURATIONS = {
+    "wash": 20,
+    "cut": 30,
+    "full": 50
+}
+DEFAULT_DURATION = 30
+
+# Какой специализации мастера нужна услуга ("все" умеют всё) — тоже начальное наполнение
+SPECIALTIES = ("мытьё", "стрижка", "все")
+SERVICE_SPECIALTIES = {
+    "wash": "мытьё",
+    "cut": "стрижка",
+    "full": "все"
+}
+
+# Сетка свободных слотов
+SLOT_STEP_MIN = int(os.getenv("SLOT_STEP_MIN", "30"))
+SLOT_DAYS_AHEAD = int(os.getenv("SLOT_DAYS_AHEAD", "7"))
+
+# FAQ (словарь); menu — подпись кнопки в главном меню
 FAQ = {
     "price": {
         "question": "Сколько стоят услуги?",
+        "menu": "💰 Прайс",
         "answer": "🚿 Мытьё — 1000 руб\n✂️ Стрижка — 1500 руб\n💎 Оба — 2200 руб"
     },
     "address": {
         "question": "Где вы находитесь?",
+        "menu": "📍 Адрес и график",
         "answer": "📍 ул. Ленина, д. 42, Новосибирск\n☎️ +7 (383) 200-11-11\n🕐 Пн–Пт 10–20, Сб–Вс 10–18"
     },
     "time": {
@@ -39,3 +128,11 @@ FAQ = {
         "answer": "✅ Да! Щенков от 3 месяцев (сначала привык, потом груминг)."
     }
 }
+
+# Коды FAQ для faq_logs (не менять у существующих); новые вопросы получают коды в каталоге
+FAQ_CODES = {
+    "price": 1,
+    "address": 2,
+    "time": 3,
+    "age": 4
+}
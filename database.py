@@ -1,24 +1,83 @@
+import asyncio
+import functools
 import os
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, create_engine, Text, Boolean, JSON
+import random
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, create_engine, Text, Boolean, JSON, Index, select, update, bindparam, event
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import declarative_base, relationship
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from datetime import datetime
 
-DATABASE_URL = "sqlite+aiosqlite:///./db/database.db"
-
-engine = create_async_engine(
-    DATABASE_URL,
-    echo=False,
-    future=True,
-    connect_args={"check_same_thread": False}
+from config import (
+    DATABASE_URL, DB_BUSY_TIMEOUT_MS, DB_MMAP_SIZE, DB_CACHE_SIZE_KB,
+    DB_READ_POOL_SIZE, DB_RETRY_ATTEMPTS, DB_RETRY_BASE_DELAY
 )
 
+
+def _set_sqlite_pragmas(readonly: bool):
+    """PRAGMA для каждого нового соединения SQLite"""
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB}")
+        if readonly:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+    return on_connect
+
+
+def create_engine_profile(url: str, readonly: bool = False, pool_size: int = 1):
+    """Движок SQLite: WAL и настройки на подключении, постоянный пул соединений"""
+    db_engine = create_async_engine(
+        url,
+        echo=False,
+        future=True,
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=pool_size,
+        max_overflow=0,
+        connect_args={"check_same_thread": False}
+    )
+    event.listen(db_engine.sync_engine, "connect", _set_sqlite_pragmas(readonly))
+    return db_engine
+
+
+# Один писатель (хендлеры, изменения) и пул читателей (web-панель, отчёты)
+engine = create_engine_profile(DATABASE_URL)
+read_engine = create_engine_profile(DATABASE_URL, readonly=True, pool_size=DB_READ_POOL_SIZE)
+
 async_session = async_sessionmaker(
     engine,
     class_=AsyncSession,
     expire_on_commit=False
 )
 
+read_session = async_sessionmaker(
+    read_engine,
+    class_=AsyncSession,
+    expire_on_commit=False
+)
+
+
+def retry_on_locked(func):
+    """Повтор записи при «database is locked» с экспоненциальной паузой"""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        delay = DB_RETRY_BASE_DELAY
+        for attempt in range(DB_RETRY_ATTEMPTS):
+            try:
+                return await func(*args, **kwargs)
+            except OperationalError as e:
+                if "locked" not in str(e) or attempt == DB_RETRY_ATTEMPTS - 1:
+                    raise
+                await asyncio.sleep(delay + random.uniform(0, delay))
+                delay *= 2
+    return wrapper
+
+
 Base = declarative_base()
 
 
@@ -61,11 +120,21 @@ class Request(Base):
     pet_name = Column(String, nullable=False)
     comment = Column(String)
     status = Column(String, default="new")  # new, approved, rejected, canceled, completed
+    slot_start = Column(DateTime)  # desired_date + desired_time
+    duration_min = Column(Integer)  # по услуге
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     user = relationship("User", back_populates="requests")
     master = relationship("Master", back_populates="requests")
+    
+    __table_args__ = (
+        Index("ix_requests_user_status_created", "user_id", "status", "created_at"),
+        Index("ix_requests_status_created", "status", "created_at"),
+        Index("ix_requests_created_id", "created_at", "id"),  # список заявок (created_at DESC, id DESC)
+        Index("ix_requests_master_slot", "master_id", "slot_start"),
+        Index("ix_requests_slot_start", "slot_start"),
+    )
 
 
 class FAQLog(Base):
@@ -73,7 +142,8 @@ class FAQLog(Base):
     
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"))
-    question = Column(String)
+    faq_code = Column(Integer)  # код вопроса из каталога (catalog.faq_codes)
+    question = Column(String)  # только для свободных вопросов
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
@@ -87,10 +157,94 @@ class ConfigItem(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
+class FSMRecord(Base):
+    __tablename__ = "fsm_states"
+    
+    chat_id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, primary_key=True)
+    state = Column(String)
+    data = Column(Text)  # JSON
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ReminderRecord(Base):
+    __tablename__ = "reminders_sent"
+    
+    request_id = Column(Integer, ForeignKey("requests.id"), primary_key=True)
+    offset_min = Column(Integer, primary_key=True)  # за сколько минут до записи
+    sent_at = Column(DateTime, default=datetime.utcnow)
+
+
+class EventRecord(Base):
+    __tablename__ = "events"
+    
+    id = Column(Integer, primary_key=True)
+    type = Column(String, nullable=False)
+    payload = Column(Text)  # JSON
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+# Колонки, добавленные после первого релиза: {таблица: {колонка: DDL}}
+MIGRATION_COLUMNS = {
+    "requests": {
+        "slot_start": "DATETIME",
+        "duration_min": "INTEGER",
+    },
+    "faq_logs": {
+        "faq_code": "INTEGER",
+    },
+}
+
+
+def _migrate(conn):
+    """Догоняем схему существующей БД: новые колонки и индексы"""
+    for table, columns in MIGRATION_COLUMNS.items():
+        existing = {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table})")}
+        for column, ddl in columns.items():
+            if column not in existing:
+                conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+    
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+def _backfill_slots(conn):
+    """Заполнение slot_start/duration_min у старых заявок"""
+    from utils.slots import parse_slot_start, service_duration
+    
+    stmt = select(Request.id, Request.service, Request.desired_date, Request.desired_time).where(
+        Request.duration_min.is_(None)
+    )
+    rows = conn.execute(stmt).all()
+    if not rows:
+        return
+    
+    params = [
+        {
+            "row_id": row.id,
+            "slot_start": parse_slot_start(row.desired_date, row.desired_time),
+            "duration_min": service_duration(row.service),
+        }
+        for row in rows
+    ]
+    conn.execute(
+        update(Request.__table__)
+        .where(Request.__table__.c.id == bindparam("row_id"))
+        .values(slot_start=bindparam("slot_start"), duration_min=bindparam("duration_min")),
+        params
+    )
+
+
 async def init_db():
     """Инициализация БД"""
+    if DATABASE_URL.startswith("sqlite") and ":///" in DATABASE_URL:
+        os.makedirs(os.path.dirname(DATABASE_URL.split(":///", 1)[1]) or ".", exist_ok=True)
+    
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_migrate)
+        await conn.run_sync(_backfill_slots)
 
 
 async def get_session():
@@ -1,56 +1,50 @@
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.filters import Command
-from sqlalchemy import select
 from datetime import datetime
 import logging
 
-from database import Request, User, async_session
 from config import ADMIN_IDS
+from utils.conflicts import SlotConflict
+from utils.transitions import change_status
+from utils.outbox import outbox
+from utils.notifications import notify_status
 
 logger = logging.getLogger(__name__)
 admin_router = Router()
 
 
-async def get_request_card(request: Request) -> str:
-    """Форматирование карточки заявки для админа"""
-    async with async_session() as session:
-        stmt = select(User).where(User.id == request.user_id)
-        result = await session.execute(stmt)
-        user = result.scalar()
-    
+def get_request_card(row) -> str:
+    """Форматирование карточки заявки для админа (строка проекции из create_request)"""
     card = (
         f"📋 НОВАЯ ЗАЯВКА\n"
         f"━━━━━━━━━━━━━━━━\n"
-        f"Услуга: {request.service}\n"
-        f"📅 Дата: {request.desired_date}\n"
-        f"⏰ Время: {request.desired_time}\n"
-        f"🐕 Питомец: {request.pet_name}\n"
-        f"☎️ Телефон: {user.phone or 'не указан'}\n"
-        f"💬 Комментарий: {request.comment or 'нет'}\n"
-        f"👤 Клиент: {user.first_name} (@{user.tg_user_id})\n"
-        f"🆔 ID заявки: {request.id}"
+        f"Услуга: {row.service}\n"
+        f"📅 Дата: {row.desired_date}\n"
+        f"⏰ Время: {row.desired_time}\n"
+        f"🐕 Питомец: {row.pet_name}\n"
+        f"☎️ Телефон: {row.phone or 'не указан'}\n"
+        f"💬 Комментарий: {row.comment or 'нет'}\n"
+        f"👤 Клиент: {row.first_name} (@{row.tg_user_id})\n"
+        f"🆔 ID заявки: {row.id}"
     )
     return card
 
 
-async def send_request_to_admins(bot, request: Request):
+async def send_request_to_admins(bot, row):
     """Отправка заявки всем админам"""
-    card = await get_request_card(request)
+    card = get_request_card(row)
     
     kb = InlineKeyboardMarkup(inline_keyboard=[
         [
-            InlineKeyboardButton(text="✅ Подтвердить", callback_data=f"approve:{request.id}"),
-            InlineKeyboardButton(text="❌ Отклонить", callback_data=f"reject:{request.id}")
+            InlineKeyboardButton(text="✅ Подтвердить", callback_data=f"approve:{row.id}"),
+            InlineKeyboardButton(text="❌ Отклонить", callback_data=f"reject:{row.id}")
         ],
-        [InlineKeyboardButton(text="🤔 Уточнить", callback_data=f"clarify:{request.id}")]
+        [InlineKeyboardButton(text="🤔 Уточнить", callback_data=f"clarify:{row.id}")]
     ])
     
     for admin_id in ADMIN_IDS:
-        try:
-            await bot.send_message(admin_id, card, reply_markup=kb)
-        except Exception as e:
-            logger.error(f"Ошибка отправки админу {admin_id}: {e}")
+        outbox.send(admin_id, card, reply_markup=kb)
 
 
 # Подтверждение заявки (админ)
@@ -63,38 +57,22 @@ async def approve_request(query: CallbackQuery, bot):
     
     request_id = int(query.data.split(":")[1])
     
-    async with async_session() as session:
-        stmt = select(Request).where(Request.id == request_id)
-        result = await session.execute(stmt)
-        request = result.scalar()
-        
-        if not request:
-            await query.answer("❌ Заявка не найдена", show_alert=True)
-            return
-        
-        request.status = "approved"
-        await session.commit()
+    try:
+        row, _ = await change_status(request_id, "approved")
+    except SlotConflict as e:
+        await query.answer(f"⚠️ Время уже занято. {e}", show_alert=True)
+        return
     
-    # Уведомление клиенту
-    async with async_session() as session:
-        stmt = select(User).where(User.id == request.user_id)
-        result = await session.execute(stmt)
-        user = result.scalar()
+    if not row:
+        await query.answer("❌ Заявка не найдена", show_alert=True)
+        return
     
-    try:
-        await bot.send_message(
-            user.tg_user_id,
-            f"✅ Ваша заявка подтверждена!\n"
-            f"📅 {request.desired_date}\n"
-            f"⏰ {request.desired_time}\n"
-            f"🐕 {request.pet_name}\n\n"
-            f"До скорого встречи! 🐕"
-        )
-    except Exception as e:
-        logger.error(f"Ошибка отправки уведомления клиенту {user.tg_user_id}: {e}")
+    # Уведомление клиенту
+    await notify_status([row])
     
+    master_line = f"💇 Мастер: {row.master_name}" if row.master_name else "💇 Мастер не назначен (нет свободных)"
     await query.message.edit_text(
-        f"✅ Заявка #{request_id} подтверждена. Клиент уведомлен."
+        f"✅ Заявка #{request_id} подтверждена. Клиент уведомлен.\n{master_line}"
     )
     await query.answer("✅ Заявка подтверждена")
 
@@ -109,35 +87,14 @@ async def reject_request(query: CallbackQuery, bot):
     
     request_id = int(query.data.split(":")[1])
     
-    async with async_session() as session:
-        stmt = select(Request).where(Request.id == request_id)
-        result = await session.execute(stmt)
-        request = result.scalar()
-        
-        if not request:
-            await query.answer("❌ Заявка не найдена", show_alert=True)
-            return
-        
-        request.status = "rejected"
-        await session.commit()
+    row, _ = await change_status(request_id, "rejected")
     
-    # Уведомление клиенту
-    async with async_session() as session:
-        stmt = select(User).where(User.id == request.user_id)
-        result = await session.execute(stmt)
-        user = result.scalar()
+    if not row:
+        await query.answer("❌ Заявка не найдена", show_alert=True)
+        return
     
-    try:
-        from handlers.user_handlers import get_main_keyboard
-        
-        await bot.send_message(
-            user.tg_user_id,
-            f"❌ К сожалению, на выбранное время {request.desired_date} {request.desired_time} нет мест.\n\n"
-            f"Выбери другое время или задай вопрос админу:",
-            reply_markup=get_main_keyboard()
-        )
-    except Exception as e:
-        logger.error(f"Ошибка отправки отклонения клиенту {user.tg_user_id}: {e}")
+    # Уведомление клиенту
+    await notify_status([row])
     
     await query.message.edit_text(
         f"❌ Заявка #{request_id} отклонена. Клиент уведомлен."
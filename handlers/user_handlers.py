@@ -1,19 +1,29 @@
 from handlers.admin_handlers import send_request_to_admins
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.types import Message, CallbackQuery
 from aiogram.filters import CommandStart, Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from sqlalchemy import select
-from datetime import datetime
+from datetime import datetime, timedelta
 import logging
 
-from database import User, Request, async_session, FAQLog
-from config import FAQ, SERVICES
+from database import Request, read_session
+from config import SPAM_TIMEOUT, SLOT_DAYS_AHEAD
 from utils.validators import (
     validate_phone, validate_date, validate_time, 
-    check_spam, get_or_create_user
+    get_or_create_user, user_cache
 )
+from utils.spam import booking_limiter
+from utils.faq_log import faq_log_buffer
+from utils.slots import DATE_FORMAT, parse_slot_start, service_duration
+from utils.availability import WEEKDAYS, availability
+from utils.catalog import catalog
+from utils.keyboards import (
+    STATUS_EMOJI, main_keyboard, cancel_keyboard, services_keyboard,
+    faq_menu_keyboard, faq_answer_keyboard, faq_answers, home_keyboard, picker_keyboard
+)
+from utils.transitions import create_request
 
 logger = logging.getLogger(__name__)
 user_router = Router()
@@ -33,20 +43,6 @@ class FAQStates(StatesGroup):
     waiting_question = State()
 
 
-# Главное меню
-def get_main_keyboard():
-    """Главное меню"""
-    kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="📅 Записаться", callback_data="book")],
-        [InlineKeyboardButton(text="💰 Прайс", callback_data="faq:price")],
-        [InlineKeyboardButton(text="📍 Адрес и график", callback_data="faq:address")],
-        [InlineKeyboardButton(text="❓ FAQ", callback_data="show_faq")],
-        [InlineKeyboardButton(text="💬 Задать вопрос", callback_data="ask_question")],
-        [InlineKeyboardButton(text="📋 Мои заявки", callback_data="my_requests")]
-    ])
-    return kb
-
-
 # /start
 @user_router.message(CommandStart())
 async def cmd_start(message: Message):
@@ -55,7 +51,7 @@ async def cmd_start(message: Message):
     await message.answer(
         f"🐕 Привет, {message.from_user.first_name}!\n"
         f"Добро пожаловать в груминг-салон! Выбери действие:",
-        reply_markup=get_main_keyboard()
+        reply_markup=main_keyboard()
     )
 
 
@@ -64,16 +60,11 @@ async def cmd_start(message: Message):
 async def book_start(query: CallbackQuery, state: FSMContext):
     """Начало записи"""
     # Проверка спама
-    if await check_spam(query.from_user.id):
-        await query.answer("⏳ Подождите 3 минуты перед новой заявкой", show_alert=True)
+    if booking_limiter.is_limited(query.from_user.id):
+        await query.answer(f"⏳ Подождите {SPAM_TIMEOUT} мин. перед новой заявкой", show_alert=True)
         return
     
-    kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text=service_name, callback_data=f"service:{code}")]
-        for code, service_name in SERVICES.items()
-    ] + [[InlineKeyboardButton(text="❌ Отмена", callback_data="cancel")]])
-    
-    await query.message.edit_text("Выбери услугу:", reply_markup=kb)
+    await query.message.edit_text("Выбери услугу:", reply_markup=services_keyboard())
     await state.set_state(BookingStates.service)
 
 
@@ -82,17 +73,67 @@ async def book_start(query: CallbackQuery, state: FSMContext):
 async def book_service(query: CallbackQuery, state: FSMContext):
     """Выбор услуги"""
     service_code = query.data.split(":")[1]
+    if service_code not in catalog.services:
+        # Кнопка из старого меню, услугу уже убрали из каталога
+        await query.message.edit_text("Выбери услугу:", reply_markup=services_keyboard())
+        return
+    
     await state.update_data(service=service_code)
     
-    await query.message.edit_text(
-        "Дата в формате ДД.ММ.ГГГГ (например, 15.01.2026):",
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="❌ Отмена", callback_data="cancel")]
-        ])
+    if not await availability.has_masters():
+        # Графиков мастеров нет — дата вручную
+        await query.message.edit_text(
+            "Дата в формате ДД.ММ.ГГГГ (например, 15.01.2026):",
+            reply_markup=cancel_keyboard()
+        )
+        await state.set_state(BookingStates.date)
+        return
+    
+    first_day = datetime.now().date() + timedelta(days=1)
+    days = await availability.free_days(first_day, SLOT_DAYS_AHEAD, service_code)
+    choices = tuple(
+        (f"{WEEKDAYS[day.weekday()]} {day.strftime('%d.%m')}", day.strftime(DATE_FORMAT))
+        for day in days
     )
+    
+    text = "Выбери дату (или введи ДД.ММ.ГГГГ):" if days else \
+        "😔 Ближайшие дни заняты. Введи дату в формате ДД.ММ.ГГГГ:"
+    await query.message.edit_text(text, reply_markup=picker_keyboard(choices, "day", 2))
     await state.set_state(BookingStates.date)
 
 
+async def time_prompt(service_code: str, date_str: str):
+    """Текст и клавиатура выбора времени; None, если на дату всё занято"""
+    if not await availability.has_masters():
+        return "Время в формате ЧЧ:ММ (например, 10:30):", cancel_keyboard()
+    
+    day = datetime.strptime(date_str, DATE_FORMAT).date()
+    slots = await availability.free_slots(day, service_code)
+    if not slots:
+        return None
+    
+    choices = tuple((slot, slot) for slot in slots)
+    return f"Свободное время на {date_str}:", picker_keyboard(choices, "slot", 4)
+
+
+# Дата кнопкой
+@user_router.callback_query(F.data.startswith("day:"), BookingStates.date)
+async def book_day(query: CallbackQuery, state: FSMContext):
+    """Выбор даты из свободных"""
+    date_str = query.data.split(":", 1)[1]
+    data = await state.get_data()
+    
+    prompt = await time_prompt(data["service"], date_str)
+    if prompt is None:
+        await query.answer("😔 На эту дату уже всё занято, выбери другую", show_alert=True)
+        return
+    
+    await state.update_data(date=date_str)
+    text, kb = prompt
+    await query.message.edit_text(text, reply_markup=kb)
+    await state.set_state(BookingStates.time)
+
+
 # Дата
 @user_router.message(BookingStates.date)
 async def book_date(message: Message, state: FSMContext):
@@ -101,16 +142,43 @@ async def book_date(message: Message, state: FSMContext):
         await message.answer("❌ Неверный формат. Используй ДД.ММ.ГГГГ (будущая дата):")
         return
     
+    data = await state.get_data()
+    prompt = await time_prompt(data["service"], message.text)
+    if prompt is None:
+        await message.answer("😔 На эту дату нет свободного времени. Введи другую дату ДД.ММ.ГГГГ:")
+        return
+    
     await state.update_data(date=message.text)
-    await message.answer(
-        "Время в формате ЧЧ:ММ (например, 10:30):",
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="❌ Отмена", callback_data="cancel")]
-        ])
-    )
+    text, kb = prompt
+    await message.answer(text, reply_markup=kb)
     await state.set_state(BookingStates.time)
 
 
+# Время кнопкой
+@user_router.callback_query(F.data.startswith("slot:"), BookingStates.time)
+async def book_slot(query: CallbackQuery, state: FSMContext):
+    """Выбор свободного времени"""
+    time_str = query.data.split(":", 1)[1]
+    data = await state.get_data()
+    
+    day = datetime.strptime(data["date"], DATE_FORMAT).date()
+    if not await availability.is_free(day, time_str, data["service"]):
+        prompt = await time_prompt(data["service"], data["date"])
+        if prompt is None:
+            await query.answer("😔 Время уже заняли, а других слотов нет", show_alert=True)
+            return
+        text, kb = prompt
+        await query.message.edit_text("⏳ Это время уже заняли. " + text, reply_markup=kb)
+        return
+    
+    await state.update_data(time=time_str)
+    await query.message.edit_text(
+        "Кличка питомца:",
+        reply_markup=cancel_keyboard()
+    )
+    await state.set_state(BookingStates.pet_name)
+
+
 # Время
 @user_router.message(BookingStates.time)
 async def book_time(message: Message, state: FSMContext):
@@ -119,12 +187,17 @@ async def book_time(message: Message, state: FSMContext):
         await message.answer("❌ Неверный формат. Используй ЧЧ:ММ (10:30):")
         return
     
+    data = await state.get_data()
+    if await availability.has_masters():
+        day = datetime.strptime(data["date"], DATE_FORMAT).date()
+        if not await availability.is_free(day, message.text, data["service"]):
+            await message.answer("❌ Это время недоступно, выбери из списка выше:")
+            return
+    
     await state.update_data(time=message.text)
     await message.answer(
         "Кличка питомца:",
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="❌ Отмена", callback_data="cancel")]
-        ])
+        reply_markup=cancel_keyboard()
     )
     await state.set_state(BookingStates.pet_name)
 
@@ -136,9 +209,7 @@ async def book_pet(message: Message, state: FSMContext):
     await state.update_data(pet_name=message.text)
     await message.answer(
         "Телефон (+7...):",
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="❌ Отмена", callback_data="cancel")]
-        ])
+        reply_markup=cancel_keyboard()
     )
     await state.set_state(BookingStates.phone)
 
@@ -154,9 +225,7 @@ async def book_phone(message: Message, state: FSMContext):
     await state.update_data(phone=message.text)
     await message.answer(
         "Комментарий (или напиши 'нет'):",
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="❌ Отмена", callback_data="cancel")]
-        ])
+        reply_markup=cancel_keyboard()
     )
     await state.set_state(BookingStates.comment)
 
@@ -170,40 +239,28 @@ async def book_comment(message: Message, state: FSMContext):
     data = await state.get_data()
     user = await get_or_create_user(message.from_user.id, message.from_user.first_name)
     
-    # Сохранение в БД
-    async with async_session() as session:
-        request = Request(
-            user_id=user.id,
-            service=data["service"],
-            desired_date=data["date"],
-            desired_time=data["time"],
-            pet_name=data["pet_name"],
-            comment=comment,
-            status="new"
-        )
-        session.add(request)
-        await session.commit()
-        await session.refresh(request)  # Добавили обновление объекта
-    
-    # Обновление телефона пользователя
-    async with async_session() as session:
-        stmt = select(User).where(User.tg_user_id == message.from_user.id)
-        result = await session.execute(stmt)
-        user = result.scalar()
-        user.phone = data["phone"]
-        await session.commit()
+    # Сохранение в БД (заявка и телефон клиента одной транзакцией)
+    row = await create_request(
+        user.id,
+        phone=data["phone"],
+        service=data["service"],
+        desired_date=data["date"],
+        desired_time=data["time"],
+        pet_name=data["pet_name"],
+        comment=comment,
+        slot_start=parse_slot_start(data["date"], data["time"]),
+        duration_min=service_duration(data["service"])
+    )
+    user_cache.pop(message.from_user.id)
+    booking_limiter.record(message.from_user.id)
     
     # 🟢 ОТПРАВКА АДМИНУ (НОВОЕ)
-    async with async_session() as session:
-        stmt = select(Request).where(Request.id == request.id)
-        result = await session.execute(stmt)
-        req_to_send = result.scalar()
-        await send_request_to_admins(message.bot, req_to_send)
+    await send_request_to_admins(message.bot, row)
     
     await message.answer(
         "✅ Заявка отправлена админу!\n"
         "Скоро мы подтвердим запись. Спасибо! 🐕",
-        reply_markup=get_main_keyboard()
+        reply_markup=main_keyboard()
     )
     
     await state.clear()
@@ -213,12 +270,7 @@ async def book_comment(message: Message, state: FSMContext):
 @user_router.callback_query(F.data == "show_faq")
 async def show_faq_menu(query: CallbackQuery):
     """Меню FAQ"""
-    kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text=faq_item["question"], callback_data=f"faq:{code}")]
-        for code, faq_item in FAQ.items()
-    ] + [[InlineKeyboardButton(text="❌ Назад", callback_data="back_menu")]])
-    
-    await query.message.edit_text("❓ Выбери вопрос:", reply_markup=kb)
+    await query.message.edit_text("❓ Выбери вопрос:", reply_markup=faq_menu_keyboard())
 
 
 # Ответ на FAQ
@@ -226,27 +278,20 @@ async def show_faq_menu(query: CallbackQuery):
 async def faq_answer(query: CallbackQuery):
     """Ответ из FAQ"""
     faq_code = query.data.split(":")[1]
+    answer = faq_answers().get(faq_code)
     
-    if faq_code not in FAQ:
+    if answer is None:
         await query.answer("❌ Вопрос не найден", show_alert=True)
         return
     
-    faq_item = FAQ[faq_code]
-    
-    # Логирование
-    async with async_session() as session:
-        user = await get_or_create_user(query.from_user.id, query.from_user.first_name)
-        log = FAQLog(user_id=user.id, question=faq_item["question"])
-        session.add(log)
-        await session.commit()
-    
-    await query.message.edit_text(
-        f"❓ {faq_item['question']}\n\n{faq_item['answer']}",
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="⬅️ Назад", callback_data="show_faq")],
-            [InlineKeyboardButton(text="🏠 Главное меню", callback_data="back_menu")]
-        ])
+    # Логирование (пачкой в фоне); вопрос без кода пишем текстом, чтобы клик не потерялся
+    code = catalog.faq_codes.get(faq_code)
+    faq_log_buffer.log(
+        query.from_user.id, query.from_user.first_name,
+        faq_code=code, question=None if code else catalog.faq[faq_code]["question"]
     )
+    
+    await query.message.edit_text(answer, reply_markup=faq_answer_keyboard())
 
 
 # Задать вопрос
@@ -255,9 +300,7 @@ async def ask_question_start(query: CallbackQuery, state: FSMContext):
     """Начало диалога "Задать вопрос" """
     await query.message.edit_text(
         "💬 Напиши свой вопрос (админ скоро ответит):",
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="❌ Отмена", callback_data="cancel")]
-        ])
+        reply_markup=cancel_keyboard()
     )
     await state.set_state(FAQStates.waiting_question)
 
@@ -265,18 +308,13 @@ async def ask_question_start(query: CallbackQuery, state: FSMContext):
 @user_router.message(FAQStates.waiting_question)
 async def ask_question_handler(message: Message, state: FSMContext):
     """Получение вопроса и отправка админу"""
-    user = await get_or_create_user(message.from_user.id, message.from_user.first_name)
-    
-    # Логирование
-    async with async_session() as session:
-        log = FAQLog(user_id=user.id, question=message.text)
-        session.add(log)
-        await session.commit()
+    # Логирование (пачкой в фоне)
+    faq_log_buffer.log(message.from_user.id, message.from_user.first_name, question=message.text)
     
     await message.answer(
         "✅ Вопрос отправлен!\n"
         "Админ ответит тебе в этом чате в ближайшее время.",
-        reply_markup=get_main_keyboard()
+        reply_markup=main_keyboard()
     )
     
     await state.clear()
@@ -288,7 +326,7 @@ async def my_requests(query: CallbackQuery):
     """Показать последние 5 заявок"""
     user = await get_or_create_user(query.from_user.id, query.from_user.first_name)
     
-    async with async_session() as session:
+    async with read_session() as session:
         stmt = select(Request).where(
             Request.user_id == user.id
         ).order_by(Request.created_at.desc()).limit(5)
@@ -302,23 +340,14 @@ async def my_requests(query: CallbackQuery):
     
     text = "📋 Твои заявки:\n\n"
     for i, req in enumerate(requests, 1):
-        status_emoji = {
-            "new": "⏳",
-            "approved": "✅",
-            "rejected": "❌",
-            "canceled": "🚫"
-        }.get(req.status, "❓")
+        status_emoji = STATUS_EMOJI.get(req.status, "❓")
         
         text += f"{i}. {status_emoji} {req.service}\n"
         text += f"   📅 {req.desired_date} {req.desired_time}\n"
         text += f"   🐕 {req.pet_name}\n"
         text += f"   Статус: {req.status}\n\n"
     
-    kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🏠 Главное меню", callback_data="back_menu")]
-    ])
-    
-    await query.message.edit_text(text, reply_markup=kb)
+    await query.message.edit_text(text, reply_markup=home_keyboard())
 
 
 # Отмена (универсальная)
@@ -327,7 +356,7 @@ async def cancel_handler(query: CallbackQuery, state: FSMContext):
     """Отмена в процессе"""
     await state.clear()
     await query.message.delete()
-    await query.message.answer("❌ Отменено", reply_markup=get_main_keyboard())
+    await query.message.answer("❌ Отменено", reply_markup=main_keyboard())
 
 
 # Назад в меню
@@ -336,5 +365,5 @@ async def back_to_menu(query: CallbackQuery):
     """Назад в главное меню"""
     await query.message.edit_text(
         "🏠 Главное меню",
-        reply_markup=get_main_keyboard()
+        reply_markup=main_keyboard()
     )
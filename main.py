@@ -3,51 +3,145 @@ import logging
 import os
 from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
+from uvicorn import Server, Config
 
-from config import BOT_TOKEN, ADMIN_IDS
+from config import (
+    BOT_TOKEN, ADMIN_IDS, BOT_MODE, WEBHOOK_BASE_URL, WEBHOOK_SECRET, WEB_HOST, WEBHOOK_PORT,
+    FSM_MAX_ENTRIES, FSM_IDLE_TTL, FSM_TTL_TICK
+)
 from database import init_db
+from utils.catalog import catalog
+from utils.spam import booking_limiter
+from utils.conflicts import booking_index
+from utils.faq_log import faq_log_buffer
+from utils.outbox import outbox
+from utils.reminders import reminder_scheduler
+from utils.events import event_bus
+from utils import metrics
+from utils.metrics import HandlerMetricsMiddleware, QueryBudgetMiddleware, TelegramMetricsMiddleware
+from utils.fsm_storage import SQLiteStorage, BoundedStorage, FSMFlushMiddleware, SessionExpiredMiddleware
 from handlers.user_handlers import user_router
 from handlers.admin_handlers import admin_router
+from webhook import create_webhook_app
 
-# Создаём папку логов если её нет
-os.makedirs("logs", exist_ok=True)
-
-# Логирование
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('logs/bot.log'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
-# Боты и диспетчер
-bot = Bot(token=BOT_TOKEN, parse_mode=ParseMode.HTML)
-dp = Dispatcher()
 
-# Регистрация роутеров
-dp.include_router(user_router)
-dp.include_router(admin_router)
+def setup_logging():
+    """Логирование в файл и консоль"""
+    # Создаём папку логов если её нет
+    os.makedirs("logs", exist_ok=True)
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('logs/bot.log'),
+            logging.StreamHandler()
+        ]
+    )
+
+
+def create_bot() -> Bot:
+    bot = Bot(token=BOT_TOKEN, parse_mode=ParseMode.HTML)
+    bot.session.middleware(TelegramMetricsMiddleware())
+    return bot
+
+
+def create_dispatcher() -> Dispatcher:
+    """Диспетчер с FSM в SQLite и роутерами"""
+    fsm_storage = SQLiteStorage()
+    bounded_storage = BoundedStorage(fsm_storage, FSM_MAX_ENTRIES, FSM_IDLE_TTL, FSM_TTL_TICK)
+
+    # FSM-middleware подключаем сами: aiogram ставит его раньше наших, и загрузка
+    # состояния из SQLite не попадала бы в бюджет
+    dp = Dispatcher(storage=bounded_storage, disable_fsm=True)
+    # Бюджет SQL считает весь апдейт: загрузку состояния FSM, хендлер и сброс FSM
+    dp.update.outer_middleware(QueryBudgetMiddleware())
+    dp.update.outer_middleware(dp.fsm)
+    dp.update.outer_middleware(FSMFlushMiddleware(fsm_storage))
+    dp.message.outer_middleware(SessionExpiredMiddleware(bounded_storage))
+    dp.callback_query.outer_middleware(SessionExpiredMiddleware(bounded_storage))
+    # Внутренние middleware видят выбранный хендлер (в т.ч. во вложенных роутерах)
+    dp.message.middleware(HandlerMetricsMiddleware("message"))
+    dp.callback_query.middleware(HandlerMetricsMiddleware("callback_query"))
+
+    # Регистрация роутеров
+    dp.include_router(user_router)
+    dp.include_router(admin_router)
 
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
+    return dp
 
-async def on_startup():
-    """Инициализация при запуске"""
-    await init_db()
+
+def use_webhook() -> bool:
+    """Webhook только если заданы публичный адрес и секрет, иначе polling"""
+    if BOT_MODE != "webhook":
+        return False
+    if not WEBHOOK_BASE_URL:
+        logger.warning("⚠️ BOT_MODE=webhook, но WEBHOOK_BASE_URL не задан — используем polling")
+        return False
+    if not WEBHOOK_SECRET:
+        # Без секрета любой POST на WEBHOOK_PATH сошёл бы за апдейт от Telegram (в т.ч. от имени админа)
+        logger.warning("⚠️ BOT_MODE=webhook, но WEBHOOK_SECRET не задан — используем polling")
+        return False
+    return True
+
+
+async def on_startup(bot: Bot, dispatcher: Dispatcher):
+    """Фоновые службы бота"""
+    await catalog.start()
+    await booking_limiter.warm()
+    await booking_index.build()
+    faq_log_buffer.start()
+    await dispatcher.fsm.storage.start()
+    outbox.start(bot)
+    await reminder_scheduler.start()
+    await event_bus.start_relay()
     logger.info(f"✅ Бот запущен. Админы: {ADMIN_IDS}")
 
 
-async def main():
-    """Главная функция"""
-    await on_startup()
-    
+async def on_shutdown():
+    """Сброс буферов и остановка служб"""
+    await faq_log_buffer.stop()
+    await catalog.stop()
+    await outbox.stop()
+    # После outbox: отметки доставленных при досылке напоминаний успевают записаться
+    await reminder_scheduler.stop()
+    await event_bus.stop_relay()
+    metrics.process_exit()
+
+
+async def run_polling(bot: Bot, dp: Dispatcher):
+    logger.info("🚀 Бот слушает обновления...")
+    await bot.delete_webhook()
+    await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+
+
+async def main(init: bool = True):
+    """Процесс бота: polling или собственный webhook-сервер"""
+    if init:
+        await init_db()
+
+    bot = create_bot()
+    dp = create_dispatcher()
+
     try:
-        logger.info("🚀 Бот слушает обновления...")
-        await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+        if use_webhook():
+            config = Config(
+                app=create_webhook_app(bot, dp),
+                host=WEB_HOST,
+                port=WEBHOOK_PORT,
+                log_level="info"
+            )
+            await Server(config).serve()
+        else:
+            await run_polling(bot, dp)
     finally:
         await bot.session.close()
 
 
 if __name__ == "__main__":
+    setup_logging()
     asyncio.run(main())
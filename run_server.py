@@ -1,17 +1,9 @@
 import asyncio
 import logging
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from uvicorn import Server, Config
-import threading
-
-from web_app import app as web_app
-from config import BOT_TOKEN, ADMIN_IDS
-from database import init_db
-from handlers.user_handlers import user_router
-from handlers.admin_handlers import admin_router
-from aiogram import Bot, Dispatcher
-from aiogram.enums import ParseMode
+import multiprocessing
+import os
+import shutil
+import sys
 
 # Логирование
 logging.basicConfig(
@@ -20,57 +12,94 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Инициализация БД
+
 async def init():
+    """Инициализация БД (один раз, до запуска процессов)"""
+    from database import init_db, engine, read_engine
+    
     await init_db()
+    # Соединения не должны переживать этот event loop
+    await engine.dispose()
+    await read_engine.dispose()
     logger.info("✅ База данных инициализирована")
 
-# CORS для web-панели
-web_app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
 
-# Бот
-bot = Bot(token=BOT_TOKEN, parse_mode=ParseMode.HTML)
-dp = Dispatcher()
-dp.include_router(user_router)
-dp.include_router(admin_router)
+def run_bot_process():
+    """Точка входа процесса бота"""
+    import main
+    
+    main.setup_logging()
+    asyncio.run(main.main(init=False))
+
 
-async def run_bot():
-    """Запуск бота"""
+def launch():
+    """Бот — отдельный процесс, web-панель — WEB_WORKERS процессов uvicorn"""
+    # События между процессами идут через БД; задаём до импорта config
+    os.environ["EVENT_RELAY"] = "1"
+    # Метрики всех процессов — в общем каталоге; файлы прошлого запуска удаляем
+    metrics_dir = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join("logs", "metrics"))
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+    
+    import uvicorn
+    from config import ADMIN_IDS, WEB_HOST, WEB_PORT, WEB_WORKERS
+    
+    asyncio.run(init())
+    logger.info(f"✅ Админы: {ADMIN_IDS}")
+    logger.info(f"🌐 Web-панель: http://localhost:{WEB_PORT} ({WEB_WORKERS} воркер.)")
+    
+    bot_process = multiprocessing.get_context("spawn").Process(target=run_bot_process, name="bot")
+    bot_process.start()
+    logger.info(f"📱 Бот: процесс {bot_process.pid}")
+    
     try:
-        logger.info("🚀 Бот слушает обновления...")
-        await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+        uvicorn.run("web_app:app", host=WEB_HOST, port=WEB_PORT, workers=WEB_WORKERS, log_level="info")
     finally:
-        await bot.session.close()
+        if bot_process.is_alive():
+            bot_process.terminate()
+        bot_process.join(15)
+        if bot_process.is_alive():
+            logger.warning("⚠️ Процесс бота не остановился, завершаем принудительно")
+            bot_process.kill()
 
-async def run_web():
-    """Запуск веб-панели"""
-    config = Config(
-        app=web_app,
-        host="0.0.0.0",
-        port=8000,
-        log_level="info"
-    )
-    server = Server(config)
-    await server.serve()
 
-async def main():
-    """Главная функция"""
-    await init()
+async def run_single():
+    """Бот и панель в одном процессе (разработка); webhook монтируется на панель"""
+    from uvicorn import Server, Config
+    
+    import main
+    from config import ADMIN_IDS, WEB_HOST, WEB_PORT
+    from database import init_db
+    from web_app import app as web_app
+    from webhook import build_webhook_router, webhook_lifecycle
+    
+    await init_db()
     logger.info(f"✅ Админы: {ADMIN_IDS}")
-    logger.info("📱 Бот: Telegram @botname")
-    logger.info("🌐 Web-панель: http://localhost:8000")
+    logger.info(f"🌐 Web-панель: http://localhost:{WEB_PORT}")
     
-    # Запуск бота и веб-панели одновременно
-    await asyncio.gather(
-        run_bot(),
-        run_web()
-    )
+    bot = main.create_bot()
+    dp = main.create_dispatcher()
+    server = Server(Config(app=web_app, host=WEB_HOST, port=WEB_PORT, log_level="info"))
+    
+    try:
+        if main.use_webhook():
+            # Обновления приходят на web-панель, отдельный long-poll не нужен
+            tasks = set()
+            web_app.include_router(build_webhook_router(bot, dp, tasks))
+            async with webhook_lifecycle(bot, dp, tasks):
+                await server.serve()
+        else:
+            # Запуск бота и веб-панели одновременно
+            await asyncio.gather(
+                main.run_polling(bot, dp),
+                server.serve()
+            )
+    finally:
+        await bot.session.close()
+
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if "--single" in sys.argv:
+        asyncio.run(run_single())
+    else:
+        launch()
@@ -0,0 +1,9 @@
+import os
+import tempfile
+
+# До импорта модулей проекта: config и database читают окружение при загрузке.
+# БД временная, админ — пользователь 1, Telegram не вызывается.
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{tempfile.mkdtemp(prefix='grooming_tests_')}/test.db"
+os.environ["ADMIN_IDS"] = "1"
+os.environ["BOT_TOKEN"] = "0:test"
+os.environ.pop("PROMETHEUS_MULTIPROC_DIR", None)
@@ -0,0 +1,143 @@
+import random
+from datetime import datetime, timedelta
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import SendMessage
+from aiogram.types import CallbackQuery, Chat, Message, Update, User as TgUser
+from sqlalchemy import insert, select
+
+from database import Master, Request, User, async_session
+from utils.catalog import catalog
+from utils.slots import DATE_FORMAT, TIME_FORMAT, service_duration
+
+# Помощники тестов и бенчмарков (bench/): тестовые данные на заполненной БД, бот без сети
+
+
+async def seed(users: int = 200, requests_per_user: int = 3, masters: int = 3, days: int = 7) -> dict:
+    """Наполнить пустую БД: мастера с графиком, клиенты, заявки в разных статусах"""
+    schedule = {day: ["10:00-20:00"] for day in ("пн", "вт", "ср", "чт", "пт", "сб", "вс")}
+    services = list(catalog.services)
+    statuses = ["new", "approved", "rejected", "canceled", "completed"]
+    first_day = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    rnd = random.Random(1)
+
+    async with async_session() as session:
+        await session.execute(insert(Master), [
+            {"name": f"Мастер {i + 1}", "specialty": "все", "is_active": True, "schedule": schedule}
+            for i in range(masters)
+        ])
+        await session.execute(insert(User), [
+            {"tg_user_id": 1_000_000 + i, "first_name": f"Клиент {i + 1}", "phone": f"+7900{i:07d}"}
+            for i in range(users)
+        ])
+        user_ids = (await session.execute(select(User.id).order_by(User.id))).scalars().all()
+        master_ids = (await session.execute(select(Master.id).order_by(Master.id))).scalars().all()
+
+        rows = []
+        for user_id in user_ids[-users:]:
+            for _ in range(requests_per_user):
+                service = rnd.choice(services)
+                slot_start = first_day + timedelta(days=rnd.randrange(days), hours=rnd.randrange(10, 19))
+                status = rnd.choice(statuses)
+                rows.append({
+                    "user_id": user_id,
+                    "master_id": rnd.choice(master_ids) if status == "approved" else None,
+                    "service": service,
+                    "desired_date": slot_start.strftime(DATE_FORMAT),
+                    "desired_time": slot_start.strftime(TIME_FORMAT),
+                    "pet_name": "Бобик",
+                    "status": status,
+                    "slot_start": slot_start,
+                    "duration_min": service_duration(service),
+                })
+        await session.execute(insert(Request), rows)
+        await session.commit()
+
+    return {"users": len(user_ids), "masters": len(master_ids), "requests": len(rows)}
+
+
+class FakeSession(BaseSession):
+    """Сессия бота без сети: запоминает вызовы API и отвечает правдоподобно"""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+        self._message_id = 0
+
+    async def make_request(self, bot, method, timeout=None):
+        self.calls.append(method)
+        if isinstance(method, SendMessage):
+            self._message_id += 1
+            return Message(
+                message_id=self._message_id,
+                date=datetime.now(),
+                chat=Chat(id=method.chat_id, type="private"),
+                text=method.text,
+            )
+        return True
+
+    def buttons(self, prefix: str, chat_id: int = None) -> list:
+        """callback_data кнопок с префиксом из последней такой клавиатуры (в чат chat_id)"""
+        for method in reversed(self.calls):
+            if chat_id is not None and getattr(method, "chat_id", None) != chat_id:
+                continue
+            markup = getattr(method, "reply_markup", None)
+            found = [
+                button.callback_data
+                for row in getattr(markup, "inline_keyboard", ())
+                for button in row
+                if button.callback_data and button.callback_data.startswith(prefix)
+            ]
+            if found:
+                return found
+        raise LookupError(f"нет кнопки {prefix}")
+
+    def button(self, prefix: str, chat_id: int = None) -> str:
+        """callback_data первой кнопки с префиксом из последней клавиатуры (в чат chat_id)"""
+        return self.buttons(prefix, chat_id)[0]
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    async def close(self):
+        pass
+
+
+_update_id = 0
+
+
+def _next_update_id() -> int:
+    global _update_id
+    _update_id += 1
+    return _update_id
+
+
+def _user(tg_user_id: int) -> TgUser:
+    return TgUser(id=tg_user_id, is_bot=False, first_name=f"Клиент {tg_user_id}")
+
+
+def message_update(tg_user_id: int, text: str) -> Update:
+    """Апдейт «пользователь написал text»"""
+    return Update(update_id=_next_update_id(), message=Message(
+        message_id=1,
+        date=datetime.now(),
+        chat=Chat(id=tg_user_id, type="private"),
+        from_user=_user(tg_user_id),
+        text=text,
+    ))
+
+
+def callback_update(tg_user_id: int, data: str) -> Update:
+    """Апдейт «пользователь нажал кнопку с callback_data=data»"""
+    return Update(update_id=_next_update_id(), callback_query=CallbackQuery(
+        id=str(_next_update_id()),
+        from_user=_user(tg_user_id),
+        chat_instance="bench",
+        data=data,
+        message=Message(
+            message_id=1,
+            date=datetime.now(),
+            chat=Chat(id=tg_user_id, type="private"),
+            from_user=_user(tg_user_id),
+            text="…",
+        ),
+    ))
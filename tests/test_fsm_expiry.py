@@ -0,0 +1,70 @@
+import asyncio
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from handlers.user_handlers import BookingStates, FAQStates
+from utils.fsm_storage import BoundedStorage, SessionExpiredMiddleware
+from tests.helpers import callback_update, message_update
+
+# После вытеснения по простою новый сценарий не должен упираться в «сессия истекла»
+
+USER_ID = 42
+KEY = StorageKey(bot_id=1, chat_id=USER_ID, user_id=USER_ID)
+
+
+async def _expired_storage() -> BoundedStorage:
+    """Хранилище, в котором запись пользователя только что истекла по простою"""
+    storage = BoundedStorage(MemoryStorage(), max_entries=100, ttl=60, tick=1)
+    await storage.set_state(KEY, BookingStates.date)
+    await storage._evict(KEY)
+    assert storage._expired
+    return storage
+
+
+async def _dispatch(storage: BoundedStorage, event) -> bool:
+    """Прогнать событие через middleware; True — дошло до хендлера"""
+    reached = []
+
+    async def handler(event, data):
+        reached.append(event)
+
+    data = {
+        "state": FSMContext(storage=storage, key=KEY),
+        "raw_state": await storage.get_state(KEY),
+    }
+    await SessionExpiredMiddleware(storage)(handler, event, data)
+    return bool(reached)
+
+
+def test_new_booking_after_expiry_reaches_handler():
+    async def scenario():
+        storage = await _expired_storage()
+        # «book» переводит в выбор услуги — отметка об истечении снимается
+        await storage.set_state(KEY, BookingStates.service)
+        event = callback_update(USER_ID, "service:wash").callback_query
+        assert await _dispatch(storage, event)
+        assert await storage.get_state(KEY) == BookingStates.service.state
+
+    asyncio.run(scenario())
+
+
+def test_question_after_expiry_reaches_handler():
+    async def scenario():
+        storage = await _expired_storage()
+        await storage.set_state(KEY, FAQStates.waiting_question)
+        event = message_update(USER_ID, "Можно с кошкой?").message
+        assert await _dispatch(storage, event)
+
+    asyncio.run(scenario())
+
+
+def test_message_in_active_state_is_not_intercepted():
+    async def scenario():
+        storage = await _expired_storage()
+        # Отметка осталась (состояние выставлено в обход обёртки), но ввод в активном шаге не перехватывается
+        await storage.inner.set_state(KEY, FAQStates.waiting_question)
+        event = message_update(USER_ID, "Можно с кошкой?").message
+        assert await _dispatch(storage, event)
+
+    asyncio.run(scenario())
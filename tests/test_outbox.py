@@ -0,0 +1,55 @@
+import asyncio
+import time
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from utils.outbox import TelegramOutbox
+
+# Чат под retry_after не должен задерживать остальные чаты и ломать свой порядок
+
+ADMIN_ID = 1
+CLIENT_IDS = range(100, 110)
+
+
+class FloodBot:
+    """Первое сообщение админу получает retry_after, остальное доставляется сразу"""
+
+    def __init__(self, retry_after: int):
+        self.retry_after = retry_after
+        self.flooded = False
+        self.delivered = []  # (chat_id, text, время от старта)
+        self.start = time.monotonic()
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if chat_id == ADMIN_ID and not self.flooded:
+            self.flooded = True
+            method = SendMessage(chat_id=chat_id, text=text)
+            raise TelegramRetryAfter(method, "Flood control exceeded", self.retry_after)
+        self.delivered.append((chat_id, text, time.monotonic() - self.start))
+
+
+def test_rate_limited_chat_does_not_block_others():
+    async def scenario():
+        outbox = TelegramOutbox(workers=2, global_rate=1000, chat_interval=0.01, max_attempts=5)
+        bot = FloodBot(retry_after=1)
+        outbox.start(bot)
+
+        for i in range(3):
+            outbox.send(ADMIN_ID, f"card {i}")
+        await asyncio.sleep(0.05)
+        for chat_id in CLIENT_IDS:
+            outbox.send(chat_id, "client")
+
+        await asyncio.wait_for(outbox.join(), 5)
+        await outbox.stop()
+        return bot.delivered
+
+    delivered = asyncio.run(scenario())
+
+    clients = [at for chat_id, _, at in delivered if chat_id != ADMIN_ID]
+    admin = [(text, at) for chat_id, text, at in delivered if chat_id == ADMIN_ID]
+    assert len(clients) == len(CLIENT_IDS)
+    assert max(clients) < 0.5
+    # Повтор идёт первым: порядок сообщений чата сохраняется
+    assert [text for text, _ in admin] == ["card 0", "card 1", "card 2"]
+    assert admin[0][1] >= 1
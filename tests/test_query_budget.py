@@ -0,0 +1,209 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+from sqlalchemy import insert, select
+
+import main
+from database import Request, User, async_session, engine, init_db, read_engine
+from utils.catalog import catalog
+from utils.metrics import track
+from utils.outbox import outbox
+from utils.slots import DATE_FORMAT, TIME_FORMAT, service_duration
+from web_app import app
+
+from tests.helpers import FakeSession, callback_update, message_update, seed
+
+# Бюджет SQL-запросов хендлеров бота и эндпоинтов панели на заполненной БД (ловит N+1).
+# Бот: запись кнопками и ручным вводом даты/времени, подтверждение и отклонение админом,
+# вопрос админу. Панель: чтение и изменения (POST/PUT).
+
+ADMIN_ID = 1
+CLIENT_ID = 42
+MANUAL_CLIENT_ID = 43  # вводит дату и время текстом
+
+# Шаг сценария бота → (SQL-запросов, соединений из пула) за весь апдейт, включая загрузку
+# и сброс FSM; для повторяющихся шагов — худший случай (новый клиент, кэш слотов сброшен каталогом).
+# Значения — текущие; уменьшаем вместе с оптимизацией хендлера, увеличивать — только осознанно
+BOT_BUDGETS = {
+    "cmd_start": (2, 2),
+    "book_start": (2, 2),
+    "book_service": (3, 3),
+    "book_day": (1, 1),
+    "book_slot": (1, 1),
+    "book_date": (1, 1),
+    "book_time": (1, 1),
+    "book_pet": (1, 1),
+    "book_phone": (1, 1),
+    "book_comment": (5, 3),
+    "my_requests": (2, 2),
+    "show_faq_menu": (0, 0),
+    "faq_answer": (0, 0),
+    "ask_question_start": (1, 1),
+    "ask_question_handler": (1, 1),
+    "approve_request": (5, 2),
+    "reject_request": (3, 1),
+}
+
+# Запрос панели → (SQL-запросов, соединений)
+WEB_BUDGETS = {
+    "GET /api/requests": (1, 1),
+    "GET /api/requests?status=new": (1, 1),
+    "GET /api/requests (NDJSON)": (1, 1),
+    "GET /api/stats": (0, 0),
+    "GET /api/masters": (1, 1),
+    "GET /api/appointments": (1, 1),
+    "GET /api/slots": (2, 2),
+    "GET /api/catalog": (0, 0),
+    "GET /api/export": (1, 1),
+    "POST /api/requests/{id}/approve": (5, 2),
+    "POST /api/requests/{id}/reject": (3, 1),
+    "POST /api/requests/bulk": (5, 2),
+    "POST /api/appointments/replan": (1, 1),
+    "PUT /api/catalog/services": (3, 2),
+}
+
+
+class Measurements(dict):
+    """Шаг → (SQL-запросов, соединений); повторяющийся шаг — худший случай"""
+
+    async def measure(self, name: str, coro):
+        with track(name) as scope:
+            await coro
+        queries, sessions = self.get(name, (0, 0))
+        self[name] = (max(queries, scope.queries), max(sessions, scope.sessions))
+
+
+async def bot_scenario(measured: Measurements):
+    """Запись кнопками и ручным вводом даты/времени, вопрос админу; админ подтверждает и отклоняет"""
+    bot = main.create_bot()
+    session = bot.session = FakeSession()
+    dp = main.create_dispatcher()
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+
+    def button_value(prefix: str, chat_id: int) -> str:
+        return session.button(prefix, chat_id)[len(prefix):]
+
+    try:
+        steps = [
+            ("cmd_start", lambda: message_update(CLIENT_ID, "/start")),
+            ("book_start", lambda: callback_update(CLIENT_ID, "book")),
+            ("book_service", lambda: callback_update(CLIENT_ID, "service:wash")),
+            ("book_day", lambda: callback_update(CLIENT_ID, session.button("day:", CLIENT_ID))),
+            ("book_slot", lambda: callback_update(CLIENT_ID, session.button("slot:", CLIENT_ID))),
+            ("book_pet", lambda: message_update(CLIENT_ID, "Бобик")),
+            ("book_phone", lambda: message_update(CLIENT_ID, "+79001234567")),
+            ("book_comment", lambda: message_update(CLIENT_ID, "нет")),
+            ("my_requests", lambda: callback_update(CLIENT_ID, "my_requests")),
+            ("show_faq_menu", lambda: callback_update(CLIENT_ID, "show_faq")),
+            ("faq_answer", lambda: callback_update(CLIENT_ID, "faq:price")),
+            ("ask_question_start", lambda: callback_update(CLIENT_ID, "ask_question")),
+            ("ask_question_handler", lambda: message_update(CLIENT_ID, "Можно с кошкой?")),
+            ("approve_request", lambda: callback_update(ADMIN_ID, session.button("approve:", ADMIN_ID))),
+            # Второй клиент вводит дату и время текстом (значения — из предложенных кнопок)
+            ("book_start", lambda: callback_update(MANUAL_CLIENT_ID, "book")),
+            ("book_service", lambda: callback_update(MANUAL_CLIENT_ID, "service:cut")),
+            ("book_date", lambda: message_update(MANUAL_CLIENT_ID, button_value("day:", MANUAL_CLIENT_ID))),
+            ("book_time", lambda: message_update(MANUAL_CLIENT_ID, button_value("slot:", MANUAL_CLIENT_ID))),
+            ("book_pet", lambda: message_update(MANUAL_CLIENT_ID, "Мурка")),
+            ("book_phone", lambda: message_update(MANUAL_CLIENT_ID, "+79007654321")),
+            ("book_comment", lambda: message_update(MANUAL_CLIENT_ID, "нет")),
+            ("reject_request", lambda: callback_update(ADMIN_ID, session.button("reject:", ADMIN_ID))),
+        ]
+        for name, make_update in steps:
+            await measured.measure(f"bot {name}", dp.feed_update(bot, make_update()))
+            # Ответы уходят через outbox — ждём их вне измеряемого блока
+            await outbox.join()
+    finally:
+        await dp.emit_shutdown(bot=bot, dispatcher=dp)
+        await dp.fsm.storage.close()
+
+
+async def web_scenario(measured: Measurements, day: str, new_ids: list):
+    """Чтение и изменения из панели; new_ids — заявки в статусе new на свободное время"""
+    ndjson = {"accept": "application/x-ndjson"}
+    steps = [
+        ("GET /api/requests", "GET", "/api/requests", None),
+        ("GET /api/requests?status=new", "GET", "/api/requests?status=new", None),
+        ("GET /api/requests (NDJSON)", "GET", "/api/requests", None),
+        ("GET /api/stats", "GET", "/api/stats", None),
+        ("GET /api/masters", "GET", "/api/masters", None),
+        ("GET /api/appointments", "GET", f"/api/appointments?day={day}", None),
+        ("GET /api/slots", "GET", f"/api/slots?day={day}&service=wash", None),
+        ("GET /api/catalog", "GET", "/api/catalog", None),
+        ("GET /api/export", "GET", f"/api/export?date_from={day}&date_to={day}", None),
+        ("POST /api/requests/{id}/approve", "POST", f"/api/requests/{new_ids[0]}/approve", None),
+        ("POST /api/requests/{id}/reject", "POST", f"/api/requests/{new_ids[1]}/reject", None),
+        ("POST /api/requests/bulk", "POST", "/api/requests/bulk", {"ids": new_ids[2:], "action": "approve"}),
+        ("POST /api/appointments/replan", "POST", f"/api/appointments/replan?day={day}", None),
+        ("PUT /api/catalog/services", "PUT", "/api/catalog/services", catalog.snapshot()["services"]),
+    ]
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        for name, method, url, body in steps:
+
+            async def call():
+                headers = ndjson if name.endswith("(NDJSON)") else None
+                response = await client.request(method, url, json=body, headers=headers)
+                response.raise_for_status()
+
+            await measured.measure(name, call())
+
+
+async def free_requests(count: int) -> list:
+    """Новые заявки на свободный день за пределами seed() — approve не упрётся в занятое время"""
+    first = datetime.now().replace(hour=10, minute=0, second=0, microsecond=0) + timedelta(days=30)
+    slots = [first + timedelta(hours=2 * i) for i in range(count)]
+    async with async_session() as session:
+        user_id = (await session.execute(select(User.id).limit(1))).scalar()
+        result = await session.execute(insert(Request).returning(Request.id), [
+            {
+                "user_id": user_id, "service": "wash", "status": "new", "pet_name": "Бобик",
+                "desired_date": slot.strftime(DATE_FORMAT), "desired_time": slot.strftime(TIME_FORMAT),
+                "slot_start": slot, "duration_min": service_duration("wash"),
+            }
+            for slot in slots
+        ])
+        ids = result.scalars().all()
+        await session.commit()
+    return ids
+
+
+async def run_scenarios() -> Measurements:
+    measured = Measurements()
+    await init_db()
+    await seed()
+    day = (datetime.now() + timedelta(days=1)).strftime(DATE_FORMAT)
+    try:
+        async with app.router.lifespan_context(app):
+            await web_scenario(measured, day, await free_requests(4))
+            await bot_scenario(measured)
+    finally:
+        # Соединения привязаны к этому event loop — другим тестам нужны новые
+        await engine.dispose()
+        await read_engine.dispose()
+    return measured
+
+
+@pytest.fixture(scope="module")
+def measured() -> Measurements:
+    """Оба сценария один раз на модуль, в одном event loop"""
+    return asyncio.run(run_scenarios())
+
+
+@pytest.mark.parametrize("name", BOT_BUDGETS)
+def test_bot_handler_within_budget(measured, name):
+    queries, sessions = measured[f"bot {name}"]
+    max_queries, max_sessions = BOT_BUDGETS[name]
+    assert queries <= max_queries, f"{name}: SQL-запросов {queries}, допустимо {max_queries}"
+    assert sessions <= max_sessions, f"{name}: соединений {sessions}, допустимо {max_sessions}"
+
+
+@pytest.mark.parametrize("name", WEB_BUDGETS)
+def test_web_endpoint_within_budget(measured, name):
+    queries, sessions = measured[name]
+    max_queries, max_sessions = WEB_BUDGETS[name]
+    assert queries <= max_queries, f"{name}: SQL-запросов {queries}, допустимо {max_queries}"
+    assert sessions <= max_sessions, f"{name}: соединений {sessions}, допустимо {max_sessions}"
@@ -0,0 +1,55 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import main
+import webhook
+
+# Webhook принимает только апдейты с секретом: иначе поддельный callback «approve» от имени админа
+
+UPDATE = {"update_id": 1}
+
+
+class RecordingDispatcher:
+    def __init__(self):
+        self.updates = []
+
+    async def feed_update(self, bot, update):
+        self.updates.append(update)
+
+
+def _client(dp) -> TestClient:
+    app = FastAPI()
+    app.include_router(webhook.build_webhook_router(None, dp, set()))
+    return TestClient(app)
+
+
+def test_update_without_secret_is_rejected(monkeypatch):
+    monkeypatch.setattr(webhook, "WEBHOOK_SECRET", "s3cret")
+    dp = RecordingDispatcher()
+    client = _client(dp)
+
+    assert client.post(webhook.WEBHOOK_PATH, json=UPDATE).status_code == 403
+    wrong = {webhook.SECRET_HEADER: "guess"}
+    assert client.post(webhook.WEBHOOK_PATH, json=UPDATE, headers=wrong).status_code == 403
+    right = {webhook.SECRET_HEADER: "s3cret"}
+    assert client.post(webhook.WEBHOOK_PATH, json=UPDATE, headers=right).status_code == 200
+    assert len(dp.updates) == 1
+
+
+def test_unconfigured_secret_rejects_everything(monkeypatch):
+    monkeypatch.setattr(webhook, "WEBHOOK_SECRET", "")
+    dp = RecordingDispatcher()
+    client = _client(dp)
+
+    assert client.post(webhook.WEBHOOK_PATH, json=UPDATE, headers={webhook.SECRET_HEADER: ""}).status_code == 403
+    assert dp.updates == []
+
+
+def test_webhook_mode_requires_secret(monkeypatch):
+    monkeypatch.setattr(main, "BOT_MODE", "webhook")
+    monkeypatch.setattr(main, "WEBHOOK_BASE_URL", "https://bot.example")
+    monkeypatch.setattr(main, "WEBHOOK_SECRET", "")
+    assert not main.use_webhook()
+
+    monkeypatch.setattr(main, "WEBHOOK_SECRET", "s3cret")
+    assert main.use_webhook()
@@ -0,0 +1,120 @@
+import logging
+from datetime import datetime, time, timedelta
+from sqlalchemy import select, update, case
+
+from database import Request, async_session, retry_on_locked
+from utils.availability import availability
+from utils.conflicts import booking_index
+from utils.events import event_bus
+from utils.queries import request_rows_stmt, request_to_dict
+from utils.slots import service_duration
+
+logger = logging.getLogger(__name__)
+
+
+class MasterAssigner:
+    """Выбор мастера: специализация, график, свободное время и равномерная загрузка"""
+
+    async def pick(self, request_id: int, service_code: str, slot_start: datetime, length: int):
+        """Наименее загруженный свободный мастер (или None)"""
+        candidates = await availability.candidates(slot_start, length, service_code)
+        day = slot_start.date()
+
+        best, best_key = None, None
+        for master_id, worked in candidates.items():
+            if await booking_index.conflicts(request_id, master_id, slot_start, length):
+                continue
+
+            # Доля занятого рабочего времени за день; без графика — просто минуты
+            load = booking_index.load(master_id, day)
+            key = (load / worked if worked else load, load, master_id)
+            if best_key is None or key < best_key:
+                best, best_key = master_id, key
+        return best
+
+    @retry_on_locked
+    async def replan_day(self, day) -> dict:
+        """Назначить мастеров всем подтверждённым заявкам дня без мастера (одним UPDATE)"""
+        start = datetime.combine(day, time.min)
+        stmt = select(Request.id, Request.service, Request.slot_start, Request.duration_min).where(
+            Request.status == "approved",
+            Request.master_id.is_(None),
+            Request.slot_start >= start,
+            Request.slot_start < start + timedelta(days=1)
+        ).order_by(Request.slot_start)
+
+        async with async_session() as session:
+            rows = (await session.execute(stmt)).all()
+
+            # Длинные услуги раньше коротких в одно время — их сложнее разместить
+            rows.sort(key=lambda row: (row.slot_start, -(row.duration_min or service_duration(row.service))))
+
+            plan = {}
+            for row in rows:
+                length = row.duration_min or service_duration(row.service)
+                master_id = await self.pick(row.id, row.service, row.slot_start, length)
+                if master_id is not None:
+                    # Сразу в индекс, чтобы следующие заявки видели загрузку
+                    booking_index.add(row.id, master_id, row.slot_start, length)
+                    plan[row.id] = master_id
+
+            def restore(request_id: int):
+                """Заявка выбывает из плана: в индексе снова без мастера"""
+                del plan[request_id]
+                row = by_id[request_id]
+                booking_index.add(request_id, None, row.slot_start, row.duration_min or service_duration(row.service))
+
+            by_id = {row.id: row for row in rows}
+            try:
+                while plan:
+                    # Условие выборки — ещё раз в WHERE: заявку могли отменить или назначить в другом процессе
+                    updated = set((await session.execute(
+                        update(Request).where(
+                            Request.id.in_(plan), Request.status == "approved", Request.master_id.is_(None)
+                        ).values(
+                            master_id=case(plan, value=Request.id), updated_at=datetime.utcnow()
+                        ).returning(Request.id).execution_options(synchronize_session=False)
+                    )).scalars())
+                    stale = [request_id for request_id in plan if request_id not in updated]
+                    # Блокировка записи взята — сверяем брони с БД (индексы других процессов могли отстать)
+                    conflicts = []
+                    for request_id in updated:
+                        row = by_id[request_id]
+                        if await booking_index.verify(
+                            session, request_id, plan[request_id], row.slot_start,
+                            row.duration_min or service_duration(row.service)
+                        ):
+                            conflicts.append(request_id)
+                    if not stale and not conflicts:
+                        await session.commit()
+                        break
+
+                    await session.rollback()
+                    for request_id in stale + conflicts:
+                        restore(request_id)
+            except Exception:
+                for request_id in list(plan):
+                    restore(request_id)
+                raise
+
+            if plan:
+                changed = (await session.execute(request_rows_stmt().where(Request.id.in_(plan)))).all()
+            else:
+                changed = []
+
+        await event_bus.publish_many([
+            ("status_changed", {
+                "id": row.id,
+                "old_status": row.status,
+                "status": row.status,
+                "request": request_to_dict(row)
+            })
+            for row in changed
+        ])
+
+        unassigned = [row.id for row in rows if row.id not in plan]
+        logger.info(f"🧑‍🔧 План на {day}: назначено {len(plan)}, без мастера {len(unassigned)}")
+        return {"assigned": plan, "unassigned": unassigned}
+
+
+master_assigner = MasterAssigner()
@@ -0,0 +1,268 @@
+import logging
+from datetime import datetime, date, time, timedelta
+from sqlalchemy import select
+
+from database import Master, Request, read_session
+from config import SLOT_STEP_MIN
+from utils.catalog import catalog
+from utils.events import event_bus
+from utils.slots import TIME_FORMAT, parse_slot_start, service_duration
+
+logger = logging.getLogger(__name__)
+
+WEEKDAYS = ("пн", "вт", "ср", "чт", "пт", "сб", "вс")
+DAY_MINUTES = 24 * 60
+
+# Заявки, занимающие время
+HOLD_STATUSES = ("new", "approved")
+
+
+def interval_bits(start: int, length: int) -> int:
+    """Битовая маска минут [start, start + length)"""
+    return ((1 << length) - 1) << start
+
+
+def compile_schedule(intervals) -> int:
+    """["10:00-14:00", ...] → битовая карта рабочих минут дня"""
+    bits = 0
+    for interval in intervals or ():
+        try:
+            begin, end = (datetime.strptime(part.strip(), TIME_FORMAT) for part in interval.split("-"))
+        except ValueError:
+            logger.warning(f"Неверный интервал графика: {interval}")
+            continue
+
+        start = begin.hour * 60 + begin.minute
+        stop = end.hour * 60 + end.minute
+        if stop > start:
+            bits |= interval_bits(start, stop - start)
+    return bits
+
+
+def can_serve(specialty: str, service_code: str) -> bool:
+    """Подходит ли мастер для услуги (специализация услуги — из каталога)"""
+    required = catalog.specialties.get(service_code)
+    return not specialty or specialty == "все" or required is None or specialty == required
+
+
+def format_minute(minute: int) -> str:
+    return f"{minute // 60:02d}:{minute % 60:02d}"
+
+
+class DaySchedule:
+    """Один день: рабочие минуты мастеров и занятые заявками интервалы"""
+
+    def __init__(self, work: dict):
+        self.work = work  # master_id → битовая карта рабочих минут
+        self.busy = dict.fromkeys(work, 0)  # master_id → битовая карта занятых минут
+        self.holds = {}  # request_id → (master_id, start, length)
+
+    def hold(self, request_id: int, master_id: int, start: int, length: int):
+        self.release(request_id)
+        length = max(1, min(length, DAY_MINUTES - start))
+        self.holds[request_id] = (master_id, start, length)
+        if master_id is not None:
+            self.busy[master_id] = self.busy.get(master_id, 0) | interval_bits(start, length)
+
+    def release(self, request_id: int):
+        entry = self.holds.pop(request_id, None)
+        if entry is None or entry[0] is None:
+            return
+
+        # Пересобираем карту мастера: его интервалы могли пересекаться
+        master_id = entry[0]
+        bits = 0
+        for other_master, start, length in self.holds.values():
+            if other_master == master_id:
+                bits |= interval_bits(start, length)
+        self.busy[master_id] = bits
+
+    def free_starts(self, masters: list, length: int, step: int) -> list:
+        """Начала слотов (в минутах), на которые найдётся свободный мастер"""
+        free = [self.work[m] & ~self.busy.get(m, 0) for m in masters if self.work.get(m)]
+        if not free:
+            return []
+
+        # Заявки без мастера занимают любого из подходящих
+        pending = [(start, start + size) for master_id, start, size in self.holds.values() if master_id is None]
+
+        starts = []
+        for start in range(0, DAY_MINUTES - length + 1, step):
+            mask = interval_bits(start, length)
+            available = sum(1 for bits in free if bits & mask == mask)
+            if not available:
+                continue
+
+            end = start + length
+            overlapping = sum(1 for begin, finish in pending if begin < end and start < finish)
+            if available > overlapping:
+                starts.append(start)
+        return starts
+
+
+class AvailabilityEngine:
+    """Свободные слоты по графикам мастеров; кэш по (день, услуга), обновляется событиями"""
+
+    def __init__(self, step: int):
+        self.step = step
+        self._masters = None  # master_id → (specialty, schedule)
+        self._days = {}  # date → DaySchedule
+        self._slots = {}  # (date, service) → ["10:00", ...]
+        self._request_days = {}  # request_id → date
+
+    def reset(self):
+        """Сбросить всё (изменились мастера или графики)"""
+        self._masters = None
+        self._days.clear()
+        self._slots.clear()
+        self._request_days.clear()
+
+    async def _load_masters(self) -> dict:
+        if self._masters is None:
+            stmt = select(Master.id, Master.specialty, Master.schedule).where(Master.is_active.is_(True))
+            async with read_session() as session:
+                result = await session.execute(stmt)
+                self._masters = {row.id: (row.specialty, row.schedule or {}) for row in result}
+        return self._masters
+
+    async def has_masters(self) -> bool:
+        """Есть ли мастера с графиком (иначе дата и время вводятся вручную)"""
+        masters = await self._load_masters()
+        return any(any(schedule.values()) for _, schedule in masters.values())
+
+    async def _ensure_days(self, days: list) -> dict:
+        """Недостающие дни — одним запросом по индексу slot_start"""
+        masters = await self._load_masters()
+        self._prune(date.today())
+
+        missing = sorted(set(days) - self._days.keys())
+        if missing:
+            loaded = {
+                day: DaySchedule({
+                    master_id: compile_schedule(schedule.get(WEEKDAYS[day.weekday()]))
+                    for master_id, (_, schedule) in masters.items()
+                })
+                for day in missing
+            }
+
+            stmt = select(
+                Request.id, Request.master_id, Request.service, Request.slot_start, Request.duration_min
+            ).where(
+                Request.slot_start >= datetime.combine(missing[0], time.min),
+                Request.slot_start < datetime.combine(missing[-1], time.min) + timedelta(days=1),
+                Request.status.in_(HOLD_STATUSES)
+            )
+            async with read_session() as session:
+                result = await session.execute(stmt)
+                for row in result:
+                    day_schedule = loaded.get(row.slot_start.date())
+                    if day_schedule is None:
+                        continue
+                    day_schedule.hold(
+                        row.id, row.master_id, row.slot_start.hour * 60 + row.slot_start.minute,
+                        row.duration_min or service_duration(row.service)
+                    )
+                    self._request_days[row.id] = row.slot_start.date()
+
+            self._days.update(loaded)
+
+        return {day: self._days[day] for day in days if day in self._days}
+
+    def _prune(self, today: date):
+        """Прошедшие дни больше не нужны"""
+        for day in [day for day in self._days if day < today]:
+            del self._days[day]
+        self._slots = {key: slots for key, slots in self._slots.items() if key[0] >= today}
+        self._request_days = {rid: day for rid, day in self._request_days.items() if day >= today}
+
+    async def free_slots(self, day: date, service_code: str) -> list:
+        """Свободное время ЧЧ:ММ на день для услуги"""
+        key = (day, service_code)
+        slots = self._slots.get(key)
+        if slots is None:
+            day_schedule = (await self._ensure_days([day])).get(day)
+            masters = [
+                master_id for master_id, (specialty, _) in (self._masters or {}).items()
+                if can_serve(specialty, service_code)
+            ]
+            starts = day_schedule.free_starts(masters, service_duration(service_code), self.step) if day_schedule else []
+            slots = [format_minute(start) for start in starts]
+            self._slots[key] = slots
+
+        now = datetime.now()
+        if day == now.date():
+            current = now.strftime(TIME_FORMAT)
+            return [slot for slot in slots if slot > current]
+        return slots
+
+    async def free_days(self, first_day: date, count: int, service_code: str) -> list:
+        """Дни из ближайших count, где есть свободное время"""
+        days = [first_day + timedelta(days=i) for i in range(count)]
+        await self._ensure_days(days)
+        return [day for day in days if await self.free_slots(day, service_code)]
+
+    async def candidates(self, slot_start: datetime, length: int, service_code: str) -> dict:
+        """Мастера, которые делают услугу и работают весь интервал: master_id → рабочих минут за день"""
+        day = slot_start.date()
+        day_schedule = (await self._ensure_days([day])).get(day)
+        capable = [
+            master_id for master_id, (specialty, _) in (self._masters or {}).items()
+            if can_serve(specialty, service_code)
+        ]
+        if not await self.has_masters():
+            # Графиков нет — подходит любой активный мастер
+            return dict.fromkeys(capable, 0)
+
+        start = slot_start.hour * 60 + slot_start.minute
+        mask = interval_bits(start, max(1, min(length, DAY_MINUTES - start)))
+        result = {}
+        for master_id in capable:
+            work = day_schedule.work.get(master_id, 0) if day_schedule else 0
+            if work & mask == mask:
+                result[master_id] = bin(work).count("1")
+        return result
+
+    async def is_free(self, day: date, time_str: str, service_code: str) -> bool:
+        return time_str in await self.free_slots(day, service_code)
+
+    def _invalidate(self, day: date):
+        self._slots = {key: slots for key, slots in self._slots.items() if key[0] != day}
+
+    def _hold(self, request_id: int, master_id: int, slot_start: datetime, length: int):
+        day = slot_start.date()
+        day_schedule = self._days.get(day)
+        if day_schedule is None:
+            return  # день не загружен — прочитается из БД при первом показе
+        day_schedule.hold(request_id, master_id, slot_start.hour * 60 + slot_start.minute, length)
+        self._request_days[request_id] = day
+        self._invalidate(day)
+
+    def _release(self, request_id: int):
+        day = self._request_days.pop(request_id, None)
+        if day in self._days:
+            self._days[day].release(request_id)
+            self._invalidate(day)
+
+    def apply_event(self, event_type: str, payload: dict):
+        """Обработчик шины событий: точечное обновление занятости"""
+        if event_type == "masters_changed":
+            self.reset()
+            return
+        if event_type not in ("request_created", "status_changed"):
+            return
+
+        request = payload["request"]
+        self._release(request["id"])
+        if request["status"] not in HOLD_STATUSES:
+            return
+
+        slot_start = parse_slot_start(request["date"], request["time"])
+        if slot_start is not None:
+            length = request.get("duration_min") or service_duration(request["service"])
+            self._hold(request["id"], request.get("master_id"), slot_start, length)
+
+
+availability = AvailabilityEngine(SLOT_STEP_MIN)
+event_bus.add_listener(availability.apply_event)
+# Длительности и специализации услуг живут в каталоге — после его смены слоты считаются заново
+catalog.on_reload(availability.reset)
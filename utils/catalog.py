@@ -0,0 +1,197 @@
+import asyncio
+import json
+import logging
+from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from database import ConfigItem, async_session, read_session, retry_on_locked
+from config import (
+    SERVICES, SERVICE_DURATIONS, SERVICE_SPECIALTIES, DEFAULT_DURATION, FAQ, FAQ_CODES, CATALOG_CHECK_INTERVAL
+)
+from utils.events import event_bus
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = "catalog_version"
+SERVICES_KEY = "services"
+FAQ_KEY = "faq"
+FAQ_CODES_KEY = "faq_codes"
+
+
+def service_info(code: str, value) -> dict:
+    """Запись услуги {name, duration, specialty}; старый формат (только название) — по config.py"""
+    if isinstance(value, dict):
+        return value
+    return {
+        "name": value,
+        "duration": SERVICE_DURATIONS.get(code, DEFAULT_DURATION),
+        "specialty": SERVICE_SPECIALTIES.get(code, "все"),
+    }
+
+
+def assign_faq_codes(faq: dict, codes: dict) -> dict:
+    """Коды для faq_logs: у известных вопросов не меняются, новые получают следующий номер"""
+    codes = dict(codes)
+    for key in faq:
+        if key not in codes:
+            codes[key] = max(codes.values(), default=0) + 1
+    return codes
+
+
+class Catalog:
+    """Услуги и FAQ из таблицы config: словари в памяти + номер версии"""
+
+    def __init__(self, services: dict, faq: dict, faq_codes: dict):
+        # До первой загрузки — значения из config.py (они же начальное наполнение БД)
+        self._set(services, faq, faq_codes)
+        self.version = 0
+        self._callbacks = []
+        self._task = None
+        self._reload = None
+
+    def _set(self, services: dict, faq: dict, faq_codes: dict):
+        self._services = {code: service_info(code, value) for code, value in services.items()}
+        self.services = {code: info["name"] for code, info in self._services.items()}
+        self.durations = {code: info["duration"] for code, info in self._services.items()}
+        self.specialties = {code: info["specialty"] for code, info in self._services.items()}
+        self.faq = dict(faq)
+        self.faq_codes = assign_faq_codes(faq, faq_codes)
+
+    def on_reload(self, callback):
+        """Вызвать callback() после смены версии (сброс кэшей отрисовки)"""
+        self._callbacks.append(callback)
+
+    async def start(self):
+        await self.seed()
+        await self.upgrade()
+        await self.load()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    @retry_on_locked
+    async def seed(self):
+        """Заполнить пустую БД значениями из config.py (коды FAQ допишет upgrade)"""
+        rows = [
+            {"key": SERVICES_KEY, "value": json.dumps(self._services, ensure_ascii=False)},
+            {"key": FAQ_KEY, "value": json.dumps(self.faq, ensure_ascii=False)},
+            {"key": VERSION_KEY, "value": "1"},
+        ]
+        async with async_session() as session:
+            await session.execute(sqlite_insert(ConfigItem).on_conflict_do_nothing(), rows)
+            await session.commit()
+
+    async def upgrade(self):
+        """Каталог старого формата (услуги без длительности, FAQ без кодов) — дописать значения из config.py"""
+        async with read_session() as session:
+            result = await session.execute(
+                select(ConfigItem.key, ConfigItem.value).where(ConfigItem.key.in_((SERVICES_KEY, FAQ_KEY, FAQ_CODES_KEY)))
+            )
+            values = dict(result.all())
+
+        services = json.loads(values[SERVICES_KEY])
+        if FAQ_CODES_KEY in values and all(isinstance(value, dict) for value in services.values()):
+            return
+
+        # Кнопки главного меню раньше были зашиты в клавиатуре — переносим подписи в вопросы
+        faq = json.loads(values[FAQ_KEY])
+        for key, item in faq.items():
+            if "menu" not in item and FAQ.get(key, {}).get("menu"):
+                item["menu"] = FAQ[key]["menu"]
+
+        await self.update(services={code: service_info(code, value) for code, value in services.items()}, faq=faq)
+        logger.info("📚 Каталог переведён на новый формат: длительность и специализация услуг, коды FAQ")
+
+    async def current_version(self) -> int:
+        """Дешёвая проверка: одна строка по уникальному ключу"""
+        async with read_session() as session:
+            value = (await session.execute(
+                select(ConfigItem.value).where(ConfigItem.key == VERSION_KEY)
+            )).scalar()
+        return int(value or 0)
+
+    async def load(self):
+        """Перечитать каталог, если версия в БД новее"""
+        keys = (VERSION_KEY, SERVICES_KEY, FAQ_KEY, FAQ_CODES_KEY)
+        async with read_session() as session:
+            result = await session.execute(select(ConfigItem.key, ConfigItem.value).where(ConfigItem.key.in_(keys)))
+            values = dict(result.all())
+
+        version = int(values.get(VERSION_KEY) or 0)
+        if version <= self.version:
+            return
+
+        self._set(
+            json.loads(values[SERVICES_KEY]),
+            json.loads(values[FAQ_KEY]),
+            json.loads(values.get(FAQ_CODES_KEY) or "{}"),
+        )
+        self.version = version
+        for callback in self._callbacks:
+            callback()
+        logger.info(f"📚 Каталог: версия {version}, услуг {len(self.services)}, вопросов FAQ {len(self.faq)}")
+
+    async def _run(self):
+        """Страховка к событию catalog_changed: сверка версии раз в интервал"""
+        while True:
+            await asyncio.sleep(CATALOG_CHECK_INTERVAL)
+            try:
+                if await self.current_version() > self.version:
+                    await self.load()
+            except Exception as e:
+                logger.error(f"Ошибка проверки каталога: {e}")
+
+    @retry_on_locked
+    async def update(self, services: dict = None, faq: dict = None) -> int:
+        """Сохранить новые услуги и/или FAQ и поднять версию (одна транзакция).
+
+        services: код → {name, duration, specialty}; faq: код → {question, answer[, menu]}.
+        Коды FAQ для faq_logs назначаются здесь и не переиспользуются после удаления вопроса.
+        """
+        async with async_session() as session:
+            result = await session.execute(
+                select(ConfigItem.key, ConfigItem.value).where(ConfigItem.key.in_((VERSION_KEY, FAQ_KEY, FAQ_CODES_KEY)))
+            )
+            values = dict(result.all())
+            version = int(values.get(VERSION_KEY) or 0) + 1
+            # Каталог без кодов (старый формат) начинает с кодов из config.py
+            codes = json.loads(values[FAQ_CODES_KEY]) if FAQ_CODES_KEY in values else FAQ_CODES
+            codes = assign_faq_codes(faq if faq is not None else json.loads(values[FAQ_KEY]), codes)
+
+            rows = [
+                {"key": VERSION_KEY, "value": str(version)},
+                {"key": FAQ_CODES_KEY, "value": json.dumps(codes, ensure_ascii=False)},
+            ]
+            if services is not None:
+                rows.append({"key": SERVICES_KEY, "value": json.dumps(services, ensure_ascii=False)})
+            if faq is not None:
+                rows.append({"key": FAQ_KEY, "value": json.dumps(faq, ensure_ascii=False)})
+
+            stmt = sqlite_insert(ConfigItem)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[ConfigItem.key],
+                set_={"value": stmt.excluded.value, "updated_at": datetime.utcnow()}
+            )
+            await session.execute(stmt, rows)
+            await session.commit()
+
+        await self.load()
+        await event_bus.publish("catalog_changed", {"version": version})
+        return version
+
+    def apply_event(self, event_type: str, payload: dict):
+        """Обработчик шины событий: другой процесс поменял каталог"""
+        if event_type == "catalog_changed" and payload["version"] > self.version:
+            self._reload = asyncio.get_running_loop().create_task(self.load())
+
+    def snapshot(self) -> dict:
+        return {"version": self.version, "services": self._services, "faq": self.faq, "faq_codes": self.faq_codes}
+
+
+catalog = Catalog(SERVICES, FAQ, FAQ_CODES)
+event_bus.add_listener(catalog.apply_event)
@@ -0,0 +1,171 @@
+import logging
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+from sqlalchemy import select, func
+
+from database import Master, Request, read_session
+from utils.events import event_bus
+from utils.slots import parse_slot_start, service_duration
+
+logger = logging.getLogger(__name__)
+
+
+class SlotConflict(Exception):
+    """Подтверждение пересекается с уже подтверждёнными записями"""
+
+    def __init__(self, request_ids: list):
+        self.request_ids = request_ids
+        super().__init__(f"Пересечение с заявками: {', '.join(f'#{i}' for i in request_ids)}")
+
+
+class BookingIndex:
+    """Подтверждённые записи: отсортированные интервалы по (мастер, день)"""
+
+    def __init__(self):
+        self._buckets = {}  # (master_id, date) → [(start, end, request_id), ...] по start
+        self._where = {}  # request_id → (master_id, date, start, end)
+        self._day_masters = {}  # date → {master_id, ...}
+        self._minutes = {}  # (master_id, date) → подтверждённых минут (загрузка мастера)
+        self._max_length = timedelta(0)
+        self._capacity = None  # сколько записей салон ведёт одновременно (активные мастера)
+        self._built = False
+
+    async def build(self):
+        """Загрузка будущих подтверждённых записей (при старте)"""
+        today = datetime.combine(datetime.now().date(), datetime.min.time())
+        stmt = select(
+            Request.id, Request.master_id, Request.service, Request.slot_start, Request.duration_min
+        ).where(Request.status == "approved", Request.slot_start >= today)
+
+        self._buckets.clear()
+        self._where.clear()
+        self._day_masters.clear()
+        self._minutes.clear()
+        async with read_session() as session:
+            result = await session.execute(stmt)
+            for row in result:
+                self.add(row.id, row.master_id, row.slot_start, row.duration_min or service_duration(row.service))
+        self._built = True
+        await self._load_capacity()
+        logger.info(f"📆 Индекс записей: {len(self._where)} подтверждённых")
+
+    async def _load_capacity(self):
+        async with read_session() as session:
+            count = (await session.execute(
+                select(func.count()).select_from(Master).where(Master.is_active.is_(True))
+            )).scalar()
+        self._capacity = max(1, count or 0)
+
+    def add(self, request_id: int, master_id: int, slot_start: datetime, length: int):
+        self.remove(request_id)
+        day = slot_start.date()
+        end = slot_start + timedelta(minutes=length)
+        insort(self._buckets.setdefault((master_id, day), []), (slot_start, end, request_id))
+        self._where[request_id] = (master_id, day, slot_start, end)
+        self._day_masters.setdefault(day, set()).add(master_id)
+        self._minutes[(master_id, day)] = self._minutes.get((master_id, day), 0) + length
+        self._max_length = max(self._max_length, end - slot_start)
+
+    def remove(self, request_id: int):
+        entry = self._where.pop(request_id, None)
+        if entry is None:
+            return
+
+        master_id, day, start, end = entry
+        bucket = self._buckets[(master_id, day)]
+        del bucket[bisect_left(bucket, (start, end, request_id))]
+        self._minutes[(master_id, day)] -= int((end - start).total_seconds() // 60)
+        if not bucket:
+            del self._buckets[(master_id, day)]
+            del self._minutes[(master_id, day)]
+            self._day_masters[day].discard(master_id)
+            if not self._day_masters[day]:
+                del self._day_masters[day]
+
+    def load(self, master_id: int, day) -> int:
+        """Подтверждённые минуты мастера за день"""
+        return self._minutes.get((master_id, day), 0)
+
+    def _overlapping(self, master_id: int, start: datetime, end: datetime, exclude: int) -> list:
+        """Записи мастера, пересекающие [start, end): bisect по началу + окно макс. длительности"""
+        bucket = self._buckets.get((master_id, start.date()), ())
+        found = []
+        for begin, finish, request_id in bucket[bisect_left(bucket, (start - self._max_length,)):]:
+            if begin >= end:
+                break
+            if finish > start and request_id != exclude:
+                found.append(request_id)
+        return found
+
+    async def conflicts(self, request_id: int, master_id: int, slot_start: datetime, length: int) -> list:
+        """id пересекающихся записей (пусто — можно подтверждать)"""
+        if not self._built:
+            await self.build()
+        if self._capacity is None:
+            await self._load_capacity()
+
+        end = slot_start + timedelta(minutes=length)
+        if master_id is not None:
+            return self._overlapping(master_id, slot_start, end, request_id)
+
+        # Мастер не назначен: занято, если все мастера салона уже заняты в это время
+        found = []
+        for other_master in self._day_masters.get(slot_start.date(), ()):
+            found += self._overlapping(other_master, slot_start, end, request_id)
+        return sorted(found) if len(found) >= self._capacity else []
+
+    async def reserve(self, request_id: int, master_id: int, slot_start: datetime, length: int):
+        """Быстрая проверка по индексу процесса и занятие интервала (окончательная — verify)"""
+        found = await self.conflicts(request_id, master_id, slot_start, length)
+        if found:
+            raise SlotConflict(found)
+        self.add(request_id, master_id, slot_start, length)
+
+    async def verify(self, session, request_id: int, master_id: int, slot_start: datetime, length: int) -> list:
+        """Пересечения по таблице requests в транзакции записи.
+
+        Индекс у каждого процесса свой и может отстать от соседних: вызывать после
+        UPDATE заявки (соединение уже держит блокировку записи), до commit.
+        """
+        if self._capacity is None:
+            await self._load_capacity()
+
+        end = slot_start + timedelta(minutes=length)
+        stmt = select(Request.id, Request.service, Request.slot_start, Request.duration_min).where(
+            Request.status == "approved",
+            Request.id != request_id,
+            Request.slot_start >= datetime.combine(slot_start.date(), datetime.min.time()),
+            Request.slot_start < end
+        )
+        if master_id is not None:
+            stmt = stmt.where(Request.master_id == master_id)
+
+        found = sorted(
+            row.id for row in await session.execute(stmt)
+            if row.slot_start + timedelta(minutes=row.duration_min or service_duration(row.service)) > slot_start
+        )
+        if master_id is None and len(found) < self._capacity:
+            return []
+        return found
+
+    def apply_event(self, event_type: str, payload: dict):
+        """Обработчик шины событий"""
+        if event_type == "masters_changed":
+            self._capacity = None
+            return
+        if event_type not in ("request_created", "status_changed"):
+            return
+
+        request = payload["request"]
+        self.remove(request["id"])
+        if request["status"] != "approved":
+            return
+
+        slot_start = parse_slot_start(request["date"], request["time"])
+        if slot_start is not None:
+            length = request.get("duration_min") or service_duration(request["service"])
+            self.add(request["id"], request.get("master_id"), slot_start, length)
+
+
+booking_index = BookingIndex()
+event_bus.add_listener(booking_index.apply_event)
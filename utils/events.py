@@ -0,0 +1,159 @@
+import asyncio
+import json
+import logging
+from sqlalchemy import select, insert, delete, func
+
+from database import EventRecord, async_session, read_session, retry_on_locked
+from config import EVENT_RELAY, EVENT_RELAY_INTERVAL, EVENT_RELAY_MAX_INTERVAL, EVENT_RELAY_KEEP
+
+logger = logging.getLogger(__name__)
+
+
+class EventBus:
+    """In-process pub/sub для событий заявок (request_created, status_changed)"""
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self._queues = set()
+        self._listeners = []
+        self._relay = None
+
+    def add_listener(self, callback):
+        """Синхронный обработчик callback(event_type, payload) для всех событий"""
+        self._listeners.append(callback)
+
+    def subscribe(self) -> asyncio.Queue:
+        """Очередь событий для одного подписчика (например, SSE-клиента)"""
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._queues.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._queues.discard(queue)
+
+    async def publish(self, event_type: str, payload: dict):
+        """Опубликовать событие (через таблицу events, если процессов несколько)"""
+        if self._relay is not None:
+            await self._relay.append(event_type, payload)
+        else:
+            self.deliver(event_type, payload)
+
+    async def publish_many(self, events: list):
+        """Несколько событий [(тип, payload), ...] — в таблицу events одной вставкой"""
+        if not events:
+            return
+        if self._relay is not None:
+            await self._relay.append_many(events)
+        else:
+            for event_type, payload in events:
+                self.deliver(event_type, payload)
+
+    def deliver(self, event_type: str, payload: dict):
+        """Разослать событие слушателям и подписчикам этого процесса"""
+        for callback in self._listeners:
+            try:
+                callback(event_type, payload)
+            except Exception as e:
+                logger.error(f"Ошибка обработчика события {event_type}: {e}")
+
+        for queue in self._queues:
+            try:
+                queue.put_nowait((event_type, payload))
+            except asyncio.QueueFull:
+                # Медленный подписчик: сбрасываем хвост и просим перечитать всё
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(("resync", {}))
+
+    async def start_relay(self):
+        """Включить межпроцессную доставку, если она настроена"""
+        if EVENT_RELAY and self._relay is None:
+            self._relay = EventRelay(self, EVENT_RELAY_INTERVAL, EVENT_RELAY_MAX_INTERVAL, EVENT_RELAY_KEEP)
+            await self._relay.start()
+
+    async def stop_relay(self):
+        if self._relay is not None:
+            await self._relay.stop()
+            self._relay = None
+
+
+class EventRelay:
+    """События между процессами: запись в таблицу events, чтение хвоста.
+
+    Интервал опроса адаптивный: interval, пока события идут (или процесс сам
+    их публикует), и удваивается до max_interval, пока их нет.
+    """
+
+    def __init__(self, bus: EventBus, interval: float, max_interval: float, keep: int):
+        self.bus = bus
+        self.interval = interval
+        self.max_interval = max_interval
+        self.keep = keep
+        self._delay = interval
+        self._active = asyncio.Event()
+        self._last_id = 0
+        self._task = None
+
+    async def append(self, event_type: str, payload: dict):
+        await self.append_many([(event_type, payload)])
+
+    @retry_on_locked
+    async def append_many(self, events: list):
+        async with async_session() as session:
+            await session.execute(insert(EventRecord), [
+                {"type": event_type, "payload": json.dumps(payload, ensure_ascii=False)}
+                for event_type, payload in events
+            ])
+            await session.commit()
+        # Своя активность — скорее всего, скоро ответят соседи: опрашиваем чаще
+        self._delay = self.interval
+        self._active.set()
+
+    async def start(self):
+        """Доставляем только события, появившиеся после старта процесса"""
+        async with read_session() as session:
+            self._last_id = (await session.execute(select(func.max(EventRecord.id)))).scalar() or 0
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        ticks = 0
+        while True:
+            self._active.clear()
+            try:
+                await asyncio.wait_for(self._active.wait(), timeout=self._delay)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                found = await self._poll()
+                self._delay = self.interval if found else min(self._delay * 2, self.max_interval)
+                ticks += 1
+                if ticks % 1000 == 0:
+                    await self._prune()
+            except Exception as e:
+                logger.error(f"Ошибка чтения событий: {e}")
+
+    async def _poll(self):
+        async with read_session() as session:
+            stmt = select(EventRecord.id, EventRecord.type, EventRecord.payload).where(
+                EventRecord.id > self._last_id
+            ).order_by(EventRecord.id)
+            rows = (await session.execute(stmt)).all()
+
+        for row in rows:
+            self._last_id = row.id
+            self.bus.deliver(row.type, json.loads(row.payload))
+        return len(rows)
+
+    async def _prune(self):
+        """Храним только последние keep событий"""
+        async with async_session() as session:
+            await session.execute(delete(EventRecord).where(EventRecord.id <= self._last_id - self.keep))
+            await session.commit()
+
+
+event_bus = EventBus()
@@ -0,0 +1,151 @@
+import asyncio
+import csv
+import io
+import logging
+import multiprocessing
+import re
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import String, and_, func, or_
+
+from database import Request, read_session
+from config import EXPORT_CSV_CHUNK, EXPORT_XLSX_WORKERS, EXPORT_XLSX_MAX_ROWS
+from utils.catalog import catalog
+from utils.queries import request_rows_stmt
+from utils.slots import DATE_FORMAT, TIME_FORMAT
+from utils.xlsx import build_xlsx
+
+logger = logging.getLogger(__name__)
+
+EXPORT_HEADER = [
+    "ID", "Создана", "Дата", "Время", "Код услуги", "Услуга", "Цена, руб", "Длительность, мин",
+    "Статус", "Клиент", "Telegram ID", "Телефон", "Питомец", "Мастер", "Комментарий",
+]
+
+PRICE_RE = re.compile(r"(\d[\d\s]*)\s*руб")
+
+
+class ExportTooLarge(Exception):
+    """Выборка больше EXPORT_XLSX_MAX_ROWS строк — выгружать в CSV"""
+
+    def __init__(self, limit: int):
+        super().__init__(f"Больше {limit} строк")
+        self.limit = limit
+
+# Цены из названий услуг каталога: разбираются один раз на версию каталога
+_prices = {}
+
+
+def service_prices() -> dict:
+    """Код услуги → цена (руб) из «✂️ Стрижка (1500 руб)»"""
+    if not _prices:
+        for code, name in catalog.services.items():
+            match = PRICE_RE.search(name)
+            _prices[code] = int(re.sub(r"\s", "", match.group(1))) if match else None
+    return _prices
+
+
+catalog.on_reload(_prices.clear)
+
+
+def _legacy_day():
+    """desired_date ДД.ММ.ГГГГ → ГГГГММДД (сравнимо строкой) для заявок без slot_start"""
+    day = Request.desired_date
+    return func.substr(day, 7, 4, type_=String) + func.substr(day, 4, 2) + func.substr(day, 1, 2)
+
+
+def export_stmt(date_from: datetime = None, date_to: datetime = None, status: str = None):
+    """Заявки за [date_from, date_to] по дате записи, в порядке записи"""
+    stmt = request_rows_stmt(status).order_by(None).order_by(Request.slot_start, Request.id)
+    legacy = Request.slot_start.is_(None)
+    if date_from is not None:
+        stmt = stmt.where(or_(
+            Request.slot_start >= date_from,
+            and_(legacy, _legacy_day() >= date_from.strftime("%Y%m%d"))
+        ))
+    if date_to is not None:
+        stmt = stmt.where(or_(
+            Request.slot_start < date_to + timedelta(days=1),
+            and_(legacy, _legacy_day() <= date_to.strftime("%Y%m%d"))
+        ))
+    return stmt
+
+
+def export_row(row, prices: dict) -> list:
+    """Строка проекции → значения колонок EXPORT_HEADER"""
+    return [
+        row.id,
+        row.created_at.strftime(f"{DATE_FORMAT} {TIME_FORMAT}") if row.created_at else "",
+        row.desired_date,
+        row.desired_time,
+        row.service,
+        catalog.services.get(row.service, row.service),
+        prices.get(row.service),
+        row.duration_min,
+        row.status,
+        row.first_name or "",
+        row.tg_user_id,
+        row.phone or "",
+        row.pet_name,
+        row.master_name or "",
+        row.comment or "",
+    ]
+
+
+async def stream_csv(stmt):
+    """CSV из серверного курсора порциями по EXPORT_CSV_CHUNK строк (память не растёт с выборкой)"""
+    prices = service_prices()
+    buffer = io.StringIO()
+    # «;» и BOM — чтобы Excel с русской локалью открыл файл без мастера импорта
+    writer = csv.writer(buffer, delimiter=";")
+
+    buffer.write("\ufeff")
+    writer.writerow(EXPORT_HEADER)
+
+    async with read_session() as session:
+        result = await session.stream(stmt)
+        async for partition in result.partitions(EXPORT_CSV_CHUNK):
+            writer.writerows(export_row(row, prices) for row in partition)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+_pool = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: не копируем в дочерний процесс event loop и соединения с БД
+        _pool = ProcessPoolExecutor(EXPORT_XLSX_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+async def export_xlsx(stmt) -> bytes:
+    """XLSX: строки читаются здесь порциями, книга собирается в пуле процессов.
+
+    Книга передаётся в пул целиком, поэтому размер ограничен EXPORT_XLSX_MAX_ROWS;
+    сверх него — ExportTooLarge (выгрузку такого размера отдаёт потоковый CSV).
+    """
+    prices = service_prices()
+    rows = []
+    async with read_session() as session:
+        result = await session.stream(stmt.limit(EXPORT_XLSX_MAX_ROWS + 1))
+        async for partition in result.partitions(EXPORT_CSV_CHUNK):
+            rows.extend(export_row(row, prices) for row in partition)
+            if len(rows) > EXPORT_XLSX_MAX_ROWS:
+                raise ExportTooLarge(EXPORT_XLSX_MAX_ROWS)
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_pool(), build_xlsx, EXPORT_HEADER, rows)
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -0,0 +1,90 @@
+import asyncio
+import logging
+from datetime import datetime
+from sqlalchemy import insert
+
+from database import FAQLog, async_session
+from config import FAQ_LOG_FLUSH_MS, FAQ_LOG_BATCH
+from utils.validators import get_or_create_user
+
+logger = logging.getLogger(__name__)
+
+
+class FAQLogBuffer:
+    """Write-behind буфер логов FAQ/вопросов: пачка раз в N мс или по M строк"""
+
+    def __init__(self, flush_interval: float, batch_size: int):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._rows = []
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._stopping = False
+
+    def log(self, tg_user_id: int, first_name: str = None, faq_code: int = None, question: str = None):
+        """Записать клик по FAQ (код) или свободный вопрос (текст) — без ожидания БД"""
+        self._rows.append((tg_user_id, first_name, faq_code, question, datetime.utcnow()))
+        if len(self._rows) >= self.batch_size:
+            self._wakeup.set()
+
+    def start(self):
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Остановить фоновую запись и сбросить остаток"""
+        if self._task is not None:
+            # Не cancel: идущий flush должен дописать свою пачку
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Одна пачка INSERT (executemany) для всего накопленного"""
+        rows, self._rows = self._rows, []
+        if not rows:
+            return
+
+        try:
+            user_ids = {}
+            for tg_user_id, first_name, *_ in rows:
+                if tg_user_id not in user_ids:
+                    user = await get_or_create_user(tg_user_id, first_name)
+                    user_ids[tg_user_id] = user.id
+
+            params = [
+                {
+                    "user_id": user_ids[tg_user_id],
+                    "faq_code": faq_code,
+                    "question": question,
+                    "created_at": created_at,
+                }
+                for tg_user_id, _, faq_code, question, created_at in rows
+            ]
+            async with async_session() as session:
+                await session.execute(insert(FAQLog), params)
+                await session.commit()
+        except asyncio.CancelledError:
+            # Прерванная пачка остаётся в буфере для следующего flush
+            self._rows[:0] = rows
+            raise
+        except Exception as e:
+            logger.error(f"Ошибка записи логов FAQ ({len(rows)} шт.): {e}")
+            # Вернём строки в буфер, но не копим бесконечно, если БД недоступна
+            if len(self._rows) + len(rows) <= self.batch_size * 10:
+                self._rows[:0] = rows
+
+
+faq_log_buffer = FAQLogBuffer(FAQ_LOG_FLUSH_MS / 1000, FAQ_LOG_BATCH)
@@ -0,0 +1,333 @@
+import asyncio
+import json
+import logging
+import math
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+from aiogram import BaseMiddleware
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey, StateType
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import Message, CallbackQuery
+from sqlalchemy import select, delete, tuple_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from database import FSMRecord, async_session, read_session
+from utils.keyboards import main_keyboard
+from utils.metrics import FSM_ENTRIES, FSM_EVICTIONS
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM в SQLite: строка на (chat, user), кэш в памяти, запись раз за обновление"""
+
+    def __init__(self):
+        self._cache = {}  # (chat_id, user_id) → [state, data]
+        self._dirty = set()
+
+    @staticmethod
+    def _key(key: StorageKey):
+        return key.chat_id, key.user_id
+
+    async def _entry(self, key: StorageKey) -> list:
+        """Read-through: в БД идём только при первом обращении к ключу"""
+        cache_key = self._key(key)
+        entry = self._cache.get(cache_key)
+        if entry is not None:
+            return entry
+
+        async with read_session() as session:
+            stmt = select(FSMRecord.state, FSMRecord.data).where(
+                FSMRecord.chat_id == key.chat_id,
+                FSMRecord.user_id == key.user_id
+            )
+            row = (await session.execute(stmt)).first()
+
+        entry = [row.state, json.loads(row.data) if row.data else {}] if row else [None, {}]
+        return self._cache.setdefault(cache_key, entry)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        entry = await self._entry(key)
+        entry[0] = state.state if isinstance(state, State) else state
+        self._dirty.add(self._key(key))
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._entry(key))[0]
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        entry = await self._entry(key)
+        entry[1] = data.copy()
+        self._dirty.add(self._key(key))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return (await self._entry(key))[1].copy()
+
+    def forget(self, key: StorageKey) -> bool:
+        """Убрать ключ из кэша (данные остаются в БД); False, если есть незаписанные изменения"""
+        cache_key = self._key(key)
+        if cache_key in self._dirty:
+            return False
+        self._cache.pop(cache_key, None)
+        return True
+
+    async def flush(self):
+        """Записать все изменённые ключи одной транзакцией"""
+        if not self._dirty:
+            return
+
+        dirty, self._dirty = self._dirty, set()
+        upserts = []
+        deletes = []
+        now = datetime.utcnow()
+        for chat_id, user_id in dirty:
+            state, data = self._cache.get((chat_id, user_id), (None, {}))
+            if state is None and not data:
+                deletes.append((chat_id, user_id))
+            else:
+                upserts.append({
+                    "chat_id": chat_id,
+                    "user_id": user_id,
+                    "state": state,
+                    "data": json.dumps(data, ensure_ascii=False),
+                    "updated_at": now,
+                })
+
+        try:
+            async with async_session() as session:
+                if upserts:
+                    stmt = sqlite_insert(FSMRecord)
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=[FSMRecord.chat_id, FSMRecord.user_id],
+                        set_={
+                            "state": stmt.excluded.state,
+                            "data": stmt.excluded.data,
+                            "updated_at": stmt.excluded.updated_at,
+                        }
+                    )
+                    await session.execute(stmt, upserts)
+                if deletes:
+                    await session.execute(
+                        delete(FSMRecord).where(tuple_(FSMRecord.chat_id, FSMRecord.user_id).in_(deletes))
+                    )
+                await session.commit()
+        except Exception as e:
+            logger.error(f"Ошибка записи FSM ({len(dirty)} ключей): {e}")
+            self._dirty |= dirty
+
+    async def purge_idle(self, ttl: float) -> list:
+        """Удалить состояния без изменений дольше ttl; вернуть (chat_id, user_id, state)"""
+        border = datetime.utcnow() - timedelta(seconds=ttl)
+        async with async_session() as session:
+            stmt = select(FSMRecord.chat_id, FSMRecord.user_id, FSMRecord.state).where(
+                FSMRecord.updated_at < border
+            )
+            rows = (await session.execute(stmt)).all()
+            if rows:
+                await session.execute(delete(FSMRecord).where(FSMRecord.updated_at < border))
+                await session.commit()
+
+        for chat_id, user_id, _ in rows:
+            self._cache.pop((chat_id, user_id), None)
+        return [tuple(row) for row in rows if row.state]
+
+    async def close(self) -> None:
+        await self.flush()
+
+
+class FSMFlushMiddleware(BaseMiddleware):
+    """После обработки обновления сбрасываем FSM одной записью (update_data + set_state)"""
+
+    def __init__(self, storage: SQLiteStorage):
+        self.storage = storage
+
+    async def __call__(self, handler, event, data):
+        try:
+            return await handler(event, data)
+        finally:
+            await self.storage.flush()
+
+
+class TimerWheel:
+    """Колесо таймеров: ключ лежит в слоте своего срока, тик забирает один слот"""
+
+    def __init__(self, tick: float, slots: int):
+        self.tick = tick
+        self._slots = [set() for _ in range(slots)]
+        self._slot_of = {}
+        self._pos = 0
+
+    def schedule(self, key, delay: float):
+        """Поставить (или переставить) ключ на срок через delay секунд"""
+        self.cancel(key)
+        ticks = min(max(1, math.ceil(delay / self.tick)), len(self._slots) - 1)
+        index = (self._pos + ticks) % len(self._slots)
+        self._slots[index].add(key)
+        self._slot_of[key] = index
+
+    def cancel(self, key):
+        index = self._slot_of.pop(key, None)
+        if index is not None:
+            self._slots[index].discard(key)
+
+    def advance(self) -> set:
+        """Сдвинуть колесо на тик и вернуть истёкшие ключи"""
+        self._pos = (self._pos + 1) % len(self._slots)
+        due, self._slots[self._pos] = self._slots[self._pos], set()
+        for key in due:
+            del self._slot_of[key]
+        return due
+
+    def __len__(self):
+        return len(self._slot_of)
+
+
+class BoundedStorage(BaseStorage):
+    """Обёртка FSM-хранилища: лимит записей в памяти и вытеснение по простою"""
+
+    def __init__(self, inner: BaseStorage, max_entries: int, ttl: float, tick: float):
+        self.inner = inner
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lru = OrderedDict()  # StorageKey → None, старые слева
+        self._wheel = TimerWheel(tick, math.ceil(ttl / tick) + 1)
+        self._expired = OrderedDict()  # (chat_id, user_id) → истёкшее состояние
+        self._task = None
+        self.evicted_ttl = 0
+        self.evicted_cap = 0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._lru),
+            "evicted_ttl": self.evicted_ttl,
+            "evicted_cap": self.evicted_cap,
+        }
+
+    def _touch(self, key: StorageKey):
+        self._lru[key] = None
+        self._lru.move_to_end(key)
+        self._wheel.schedule(key, self.ttl)
+
+    async def _admit(self, key: StorageKey):
+        """Учесть обращение и при переполнении вытеснить самый старый ключ"""
+        is_new = key not in self._lru
+        self._touch(key)
+        while len(self._lru) > self.max_entries:
+            oldest, _ = self._lru.popitem(last=False)
+            self._wheel.cancel(oldest)
+            self.evicted_cap += 1
+            FSM_EVICTIONS.labels("capacity").inc()
+            await self._evict(oldest, keep_persisted=True)
+        if is_new:
+            FSM_ENTRIES.set(len(self._lru))
+
+    async def _evict(self, key: StorageKey, keep_persisted: bool = False):
+        """Освободить память ключа; брошенное состояние сбрасывается"""
+        if keep_persisted and hasattr(self.inner, "forget") and self.inner.forget(key):
+            return
+
+        state = await self.inner.get_state(key)
+        if state is not None:
+            await self.inner.set_state(key, None)
+            await self.inner.set_data(key, {})
+            if hasattr(self.inner, "flush"):
+                await self.inner.flush()
+            self._mark_expired((key.chat_id, key.user_id), state)
+
+        if isinstance(self.inner, MemoryStorage):
+            self.inner.storage.pop(key, None)
+        elif hasattr(self.inner, "forget"):
+            self.inner.forget(key)
+
+    def _mark_expired(self, chat_user, state: str):
+        self._expired[chat_user] = state
+        if len(self._expired) > self.max_entries:
+            self._expired.popitem(last=False)
+
+    def pop_expired(self, key: StorageKey) -> Optional[str]:
+        """Состояние, которое истекло у пользователя (один раз)"""
+        return self._expired.pop((key.chat_id, key.user_id), None)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await self._admit(key)
+        if state is not None:
+            # Пользователь начал новый сценарий — старая отметка об истечении больше не актуальна
+            self._expired.pop((key.chat_id, key.user_id), None)
+        await self.inner.set_state(key, state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        await self._admit(key)
+        return await self.inner.get_state(key)
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        await self._admit(key)
+        await self.inner.set_data(key, data)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        await self._admit(key)
+        return await self.inner.get_data(key)
+
+    async def start(self):
+        """Запуск колеса; состояния, простоявшие в БД дольше TTL, сразу истекают"""
+        if hasattr(self.inner, "purge_idle"):
+            for chat_id, user_id, state in await self.inner.purge_idle(self.ttl):
+                self._mark_expired((chat_id, user_id), state)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self._wheel.tick)
+            due = self._wheel.advance()
+            for key in due:
+                self._lru.pop(key, None)
+                try:
+                    await self._evict(key)
+                except Exception as e:
+                    logger.error(f"Ошибка вытеснения FSM {key.chat_id}/{key.user_id}: {e}")
+            if due:
+                self.evicted_ttl += len(due)
+                FSM_EVICTIONS.labels("idle").inc(len(due))
+                FSM_ENTRIES.set(len(self._lru))
+                logger.info(f"⌛ FSM: вытеснено по простою {len(due)}, в памяти {len(self._lru)}")
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.inner.close()
+
+
+class SessionExpiredMiddleware(BaseMiddleware):
+    """Сообщаем об истёкшей записи, когда пользователь вернулся к ней"""
+
+    # Кнопки шагов записи; остальные (меню, FAQ, «Мои заявки») проходят как обычно
+    BOOKING_CALLBACKS = ("service:", "day:", "slot:", "cancel")
+
+    def __init__(self, storage: BoundedStorage, group: str = "BookingStates"):
+        self.storage = storage
+        self.prefix = f"{group}:"
+
+    def _is_booking_input(self, event) -> bool:
+        """Ввод, который попал бы в шаг записи (кроме команд вроде /start)"""
+        if isinstance(event, CallbackQuery):
+            return (event.data or "").startswith(self.BOOKING_CALLBACKS)
+        return isinstance(event, Message) and not (event.text or "").startswith("/")
+
+    async def __call__(self, handler, event, data):
+        state = data.get("state")
+        # Перехватываем только вне сценария: ввод в активном состоянии всегда идёт хендлеру
+        if state is None or data.get("raw_state") is not None or not self._is_booking_input(event):
+            return await handler(event, data)
+
+        expired = self.storage.pop_expired(state.key)
+        if not expired or not expired.startswith(self.prefix):
+            return await handler(event, data)
+
+        text = "⌛ Сессия записи истекла, начни заново:"
+        if isinstance(event, CallbackQuery):
+            await event.answer()
+            await event.message.answer(text, reply_markup=main_keyboard())
+        else:
+            await event.answer(text, reply_markup=main_keyboard())
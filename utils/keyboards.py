@@ -0,0 +1,113 @@
+from functools import lru_cache
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+from utils.catalog import catalog
+
+# Готовые клавиатуры собираются один раз и используются всеми апдейтами —
+# объекты общие, изменять их нельзя
+_cache = {}
+
+STATUS_EMOJI = {
+    "new": "⏳",
+    "approved": "✅",
+    "rejected": "❌",
+    "canceled": "🚫",
+    "completed": "✔️",
+}
+
+
+def cached(builder):
+    """Клавиатура строится при первом обращении и живёт до invalidate()"""
+    def get():
+        markup = _cache.get(builder.__name__)
+        if markup is None:
+            markup = _cache[builder.__name__] = builder()
+        return markup
+    get.__name__ = builder.__name__
+    get.__doc__ = builder.__doc__
+    return get
+
+
+def invalidate():
+    """Сбросить всё (изменился каталог услуг или FAQ)"""
+    _cache.clear()
+    picker_keyboard.cache_clear()
+
+
+@cached
+def main_keyboard():
+    """Главное меню; вопросы FAQ с подписью menu выводятся отдельными кнопками"""
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="📅 Записаться", callback_data="book")],
+    ] + [
+        [InlineKeyboardButton(text=faq_item["menu"], callback_data=f"faq:{code}")]
+        for code, faq_item in catalog.faq.items() if faq_item.get("menu")
+    ] + [
+        [InlineKeyboardButton(text="❓ FAQ", callback_data="show_faq")],
+        [InlineKeyboardButton(text="💬 Задать вопрос", callback_data="ask_question")],
+        [InlineKeyboardButton(text="📋 Мои заявки", callback_data="my_requests")]
+    ])
+
+
+@cached
+def cancel_keyboard():
+    """Одна кнопка «Отмена» для шагов записи"""
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="❌ Отмена", callback_data="cancel")]
+    ])
+
+
+@cached
+def services_keyboard():
+    """Выбор услуги"""
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=service_name, callback_data=f"service:{code}")]
+        for code, service_name in catalog.services.items()
+    ] + [[InlineKeyboardButton(text="❌ Отмена", callback_data="cancel")]])
+
+
+@cached
+def faq_menu_keyboard():
+    """Список вопросов FAQ"""
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=faq_item["question"], callback_data=f"faq:{code}")]
+        for code, faq_item in catalog.faq.items()
+    ] + [[InlineKeyboardButton(text="❌ Назад", callback_data="back_menu")]])
+
+
+@cached
+def faq_answer_keyboard():
+    """Под ответом FAQ"""
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="⬅️ Назад", callback_data="show_faq")],
+        [InlineKeyboardButton(text="🏠 Главное меню", callback_data="back_menu")]
+    ])
+
+
+@cached
+def home_keyboard():
+    """Только «Главное меню»"""
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="🏠 Главное меню", callback_data="back_menu")]
+    ])
+
+
+@cached
+def faq_answers():
+    """Готовые тексты ответов FAQ: код → текст сообщения"""
+    return {
+        code: f"❓ {faq_item['question']}\n\n{faq_item['answer']}"
+        for code, faq_item in catalog.faq.items()
+    }
+
+
+@lru_cache(maxsize=256)
+def picker_keyboard(choices: tuple, prefix: str, width: int):
+    """Сетка кнопок выбора ((текст, значение), ...) + «Отмена» — одинаковые наборы слотов и дат переиспользуются"""
+    buttons = [InlineKeyboardButton(text=text, callback_data=f"{prefix}:{value}") for text, value in choices]
+    return InlineKeyboardMarkup(inline_keyboard=[
+        buttons[i:i + width] for i in range(0, len(buttons), width)
+    ] + [[InlineKeyboardButton(text="❌ Отмена", callback_data="cancel")]])
+
+
+catalog.on_reload(invalidate)
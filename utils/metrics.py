@@ -0,0 +1,230 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+from sqlalchemy import event
+
+from database import engine, read_engine
+from config import QUERY_BUDGET, SESSION_BUDGET
+
+logger = logging.getLogger(__name__)
+
+# Метрики Prometheus. При запуске через run_server.py все процессы (бот и воркеры
+# uvicorn) пишут в общий каталог PROMETHEUS_MULTIPROC_DIR, /metrics собирает их вместе.
+# Подписи меток — только имена хендлеров, шаблоны маршрутов и методы API (их немного).
+
+HANDLER_SECONDS = Histogram(
+    "bot_handler_seconds", "Время обработки апдейта хендлером бота", ["event", "handler"]
+)
+HANDLER_ERRORS = Counter(
+    "bot_handler_errors_total", "Исключения в хендлерах бота", ["event", "handler"]
+)
+WEB_SECONDS = Histogram(
+    "web_request_seconds", "Время ответа web-панели (до заголовков)", ["method", "route", "status"]
+)
+DB_SECONDS = Histogram(
+    "db_query_seconds", "Время SQL-запросов", ["engine", "statement"],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5)
+)
+DB_ERRORS = Counter(
+    "db_query_errors_total", "Ошибки SQL-запросов", ["engine"]
+)
+TELEGRAM_SECONDS = Histogram(
+    "telegram_request_seconds", "Время вызовов Telegram Bot API", ["method"]
+)
+TELEGRAM_ERRORS = Counter(
+    "telegram_errors_total", "Ошибки вызовов Telegram Bot API", ["method", "error"]
+)
+# Outbox работает только в процессе бота; livesum — сумма по живым процессам
+OUTBOX_DEPTH = Gauge(
+    "telegram_outbox_depth", "Сообщений в очереди outbox", multiprocess_mode="livesum"
+)
+OUTBOX_MESSAGES = Counter(
+    "telegram_outbox_messages_total", "Исходящие сообщения outbox по результату", ["result"]
+)
+FSM_ENTRIES = Gauge(
+    "fsm_entries", "Записей FSM в памяти бота", multiprocess_mode="livesum"
+)
+FSM_EVICTIONS = Counter(
+    "fsm_evictions_total", "Вытеснения записей FSM из памяти", ["reason"]
+)
+# Анти-спам записи живёт в процессе бота: limited — отказ без запроса к БД
+BOOKING_LIMITER_CHECKS = Counter(
+    "booking_limiter_checks_total", "Проверки анти-спама записи по результату", ["result"]
+)
+BOOKING_LIMITER_TRACKED = Gauge(
+    "booking_limiter_tracked", "Пользователей в окне анти-спама", multiprocess_mode="livesum"
+)
+BUDGET_EXCEEDED = Counter(
+    "query_budget_exceeded_total", "Апдейты и запросы панели сверх бюджета SQL", ["scope"]
+)
+
+SQL_STATEMENTS = {"SELECT", "INSERT", "UPDATE", "DELETE"}
+
+
+class QueryScope:
+    """Счётчики SQL одного апдейта / HTTP-запроса; вложенный блок считается и во внешнем"""
+
+    __slots__ = ("name", "queries", "sessions", "parent")
+
+    def __init__(self, name: str, parent=None):
+        self.name = name
+        self.queries = 0
+        self.sessions = 0  # соединений, взятых из пула
+        self.parent = parent
+
+
+_scope = ContextVar("query_scope", default=None)
+
+
+@contextmanager
+def track(name: str):
+    """Считать запросы внутри блока (в т.ч. в задачах, созданных из него)"""
+    scope = QueryScope(name, _scope.get())
+    token = _scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _scope.reset(token)
+
+
+def name_scope(name: str):
+    """Уточнить имя текущего блока (хендлер известен только внутри диспетчера)"""
+    scope = _scope.get()
+    if scope is not None:
+        scope.name = name
+
+
+def check_budget(scope: QueryScope, queries: int = QUERY_BUDGET, sessions: int = SESSION_BUDGET) -> bool:
+    """Записать в лог блок, превысивший бюджет"""
+    if scope.queries <= queries and scope.sessions <= sessions:
+        return True
+    BUDGET_EXCEEDED.labels(scope.name).inc()
+    logger.warning(
+        f"🐢 {scope.name}: SQL-запросов {scope.queries} (бюджет {queries}), "
+        f"соединений {scope.sessions} (бюджет {sessions})"
+    )
+    return False
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Внутренний middleware: время и ошибки каждого сработавшего хендлера"""
+
+    def __init__(self, event_type: str):
+        self.event_type = event_type
+
+    async def __call__(self, handler, event, data):
+        handler_object = data.get("handler")
+        name = getattr(handler_object.callback, "__name__", "unknown") if handler_object else "unknown"
+        name_scope(name)
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.labels(self.event_type, name).inc()
+            raise
+        finally:
+            HANDLER_SECONDS.labels(self.event_type, name).observe(time.perf_counter() - start)
+
+
+class QueryBudgetMiddleware(BaseMiddleware):
+    """Внешний middleware апдейта: бюджет SQL на всю обработку, включая загрузку и сброс FSM"""
+
+    async def __call__(self, handler, event, data):
+        with track(f"update:{event.event_type}") as scope:
+            try:
+                return await handler(event, data)
+            finally:
+                check_budget(scope)
+
+
+class TelegramMetricsMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: время и ошибки исходящих запросов к Telegram"""
+
+    async def __call__(self, make_request, bot, method):
+        name = method.__api_method__
+        start = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            TELEGRAM_ERRORS.labels(name, type(e).__name__).inc()
+            raise
+        finally:
+            TELEGRAM_SECONDS.labels(name).observe(time.perf_counter() - start)
+
+
+def observe_web(method: str, route: str, status: int, seconds: float):
+    WEB_SECONDS.labels(method, route, str(status)).observe(seconds)
+
+
+def instrument_engine(db_engine, name: str):
+    """События движка: длительность запросов по типу (SELECT/INSERT/...) и счётчики текущего блока"""
+    sync_engine = db_engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_start = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        scope = _scope.get()
+        while scope is not None:
+            scope.queries += 1
+            scope = scope.parent
+        keyword = statement.lstrip()[:6].upper()
+        DB_SECONDS.labels(name, keyword if keyword in SQL_STATEMENTS else "OTHER").observe(
+            time.perf_counter() - context._metrics_start
+        )
+
+    @event.listens_for(sync_engine, "checkout")
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        scope = _scope.get()
+        while scope is not None:
+            scope.sessions += 1
+            scope = scope.parent
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(exception_context):
+        DB_ERRORS.labels(name).inc()
+
+
+def _registry():
+    """Реестр с метриками всех процессов (или только этого, без PROMETHEUS_MULTIPROC_DIR)"""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def render() -> tuple:
+    """Тело и Content-Type ответа /metrics"""
+    return generate_latest(_registry()), CONTENT_TYPE_LATEST
+
+
+def outbox_stats() -> dict:
+    """Очередь outbox процесса бота — из общих метрик, доступна в любом воркере панели"""
+    stats = {"depth": 0, "sent": 0, "failed": 0, "retried": 0}
+    for family in _registry().collect():
+        for sample in family.samples:
+            if sample.name == "telegram_outbox_depth":
+                stats["depth"] += int(sample.value)
+            elif sample.name == "telegram_outbox_messages_total":
+                stats[sample.labels["result"]] += int(sample.value)
+    return stats
+
+
+def process_exit():
+    """Процесс завершается: его gauge больше не учитываются"""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(os.getpid())
+
+
+instrument_engine(engine, "write")
+instrument_engine(read_engine, "read")
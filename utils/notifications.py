@@ -0,0 +1,71 @@
+import logging
+
+from utils.events import event_bus
+from utils.keyboards import main_keyboard
+from utils.outbox import outbox
+
+logger = logging.getLogger(__name__)
+
+
+def approved_text(row) -> str:
+    """Клиенту: заявка подтверждена (строка проекции request_rows_stmt)"""
+    master_line = f"💇 Мастер: {row.master_name}\n" if row.master_name else ""
+    return (
+        f"✅ Ваша заявка подтверждена!\n"
+        f"📅 {row.desired_date}\n"
+        f"⏰ {row.desired_time}\n"
+        f"🐕 {row.pet_name}\n"
+        f"{master_line}\n"
+        f"До скорого встречи! 🐕"
+    )
+
+
+def rejected_text(row) -> str:
+    """Клиенту: на выбранное время мест нет"""
+    return (
+        f"❌ К сожалению, на выбранное время {row.desired_date} {row.desired_time} нет мест.\n\n"
+        f"Выбери другое время или задай вопрос админу:"
+    )
+
+
+# Статус → (текст, показать главное меню)
+STATUS_MESSAGES = {
+    "approved": (approved_text, False),
+    "rejected": (rejected_text, True),
+}
+
+
+async def notify_status(rows):
+    """Уведомить клиентов о новых статусах одной пачкой.
+
+    В процессе бота — сразу в outbox; из процессов web-панели (там outbox
+    не запущен) — событием notify, которое отправит процесс бота.
+    """
+    messages = []
+    for row in rows:
+        template = STATUS_MESSAGES.get(row.status)
+        if template is not None:
+            render, menu = template
+            messages.append({"chat_id": row.tg_user_id, "text": render(row), "menu": menu})
+
+    if not messages:
+        return
+    if outbox.running:
+        deliver_notifications("notify", {"messages": messages})
+    else:
+        await event_bus.publish("notify", {"messages": messages})
+
+
+def deliver_notifications(event_type: str, payload: dict):
+    """Обработчик шины событий: сообщения клиентам в outbox процесса бота"""
+    if event_type != "notify" or not outbox.running:
+        return
+
+    for message in payload["messages"]:
+        if message.get("menu"):
+            outbox.send(message["chat_id"], message["text"], reply_markup=main_keyboard())
+        else:
+            outbox.send(message["chat_id"], message["text"])
+
+
+event_bus.add_listener(deliver_notifications)
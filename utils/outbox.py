@@ -0,0 +1,236 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+from aiogram.exceptions import TelegramRetryAfter, TelegramForbiddenError, TelegramBadRequest
+
+from utils.metrics import OUTBOX_DEPTH, OUTBOX_MESSAGES
+from config import OUTBOX_WORKERS, OUTBOX_GLOBAL_RATE, OUTBOX_CHAT_INTERVAL, OUTBOX_MAX_ATTEMPTS
+
+logger = logging.getLogger(__name__)
+
+# Как часто чистить по-чатовые лимиты с истёкшим временем (секунды)
+CHAT_PRUNE_INTERVAL = 60
+
+
+@dataclass
+class OutgoingMessage:
+    chat_id: int
+    text: str
+    kwargs: dict = field(default_factory=dict)
+    attempts: int = 0
+    on_sent: Optional[Callable[[], None]] = None  # вызывается после успешной доставки
+
+
+class RateLimiter:
+    """Равномерный лимит: не больше rate вызовов в секунду"""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate
+        self._next = 0.0
+
+    async def acquire(self):
+        now = time.monotonic()
+        slot = max(now, self._next)
+        self._next = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class TelegramOutbox:
+    """Очередь исходящих сообщений: общий и по-чатовый лимит, воркеры, retry_after.
+
+    Сообщение в чат, который ещё не может принимать (лимит или retry_after), не держит
+    воркера: оно откладывается в очередь своего чата и возвращается в общую по таймеру.
+    Сообщения одного чата уходят в порядке постановки, в том числе при повторах.
+    """
+
+    def __init__(self, workers: int, global_rate: float, chat_interval: float, max_attempts: int):
+        self.workers = workers
+        self.chat_interval = chat_interval
+        self.max_attempts = max_attempts
+        self.queue = asyncio.Queue()
+        self._limiter = RateLimiter(global_rate)
+        self._chat_next = {}  # chat_id → monotonic-время следующего разрешённого сообщения
+        self._next_prune = 0.0
+        self._deferred = {}  # chat_id → deque отложенных сообщений (чат занят, пока ключ есть)
+        self._timers = {}  # chat_id → TimerHandle выпуска следующего отложенного
+        self._released = {}  # chat_id → выпущенное в общую очередь сообщение чата
+        self._sending = set()  # чаты, сообщение которых сейчас у Telegram
+        self._bot = None
+        self._tasks = []
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+
+    @property
+    def running(self) -> bool:
+        """Воркеры запущены (процесс бота)"""
+        return bool(self._tasks)
+
+    @property
+    def depth(self) -> int:
+        """Сколько сообщений ждёт отправки (в общей очереди и отложенных по чатам)"""
+        return self.queue.qsize() + sum(len(waiting) for waiting in self._deferred.values())
+
+    def stats(self) -> dict:
+        return {"depth": self.depth, "sent": self.sent, "failed": self.failed, "retried": self.retried}
+
+    def send(self, chat_id: int, text: str, on_sent: Callable[[], None] = None, **kwargs):
+        """Поставить сообщение в очередь (хендлер не ждёт Telegram)"""
+        self._put(OutgoingMessage(chat_id, text, kwargs, on_sent=on_sent))
+
+    def _put(self, message: OutgoingMessage):
+        self.queue.put_nowait(message)
+        OUTBOX_DEPTH.set(self.depth)
+
+    def start(self, bot):
+        self._bot = bot
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def join(self):
+        """Дождаться отправки всего, что поставлено, включая отложенное по чатам"""
+        while True:
+            await self.queue.join()
+            if not self._deferred:
+                return
+            await asyncio.sleep(min(self.chat_interval, 0.05))
+
+    async def stop(self, timeout: float = 5):
+        """Дослать очередь и отложенные сообщения (не дольше timeout) и остановить воркеров"""
+        if self._tasks:
+            try:
+                await asyncio.wait_for(self.join(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        if self.depth:
+            logger.warning(f"📤 Не отправлено при остановке: {self.depth}")
+        for handle in self._timers.values():
+            handle.cancel()
+        self._timers.clear()
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    async def _worker(self):
+        while True:
+            message = await self.queue.get()
+            OUTBOX_DEPTH.set(self.depth)
+            try:
+                if self._admit(message):
+                    self._sending.add(message.chat_id)
+                    try:
+                        await self._deliver(message)
+                    finally:
+                        self._sending.discard(message.chat_id)
+                        self._after_attempt(message.chat_id)
+            except Exception as e:
+                logger.error(f"Ошибка воркера отправки: {e}")
+            finally:
+                self.queue.task_done()
+            self._prune_chats()
+
+    def _admit(self, message: OutgoingMessage) -> bool:
+        """Можно ли слать сейчас; иначе сообщение уходит в очередь своего чата"""
+        chat_id = message.chat_id
+        if self._released.get(chat_id) is message:
+            del self._released[chat_id]
+            return True
+
+        waiting = self._deferred.get(chat_id)
+        if waiting is not None:
+            # Чат занят — за ранее отложенными, порядок чата сохраняется
+            waiting.append(message)
+            return False
+
+        now = time.monotonic()
+        slot = self._chat_next.get(chat_id, 0.0)
+        if slot > now:
+            self._deferred[chat_id] = deque([message])
+            self._schedule(chat_id)
+            return False
+
+        self._chat_next[chat_id] = now + self.chat_interval
+        return True
+
+    def _schedule(self, chat_id: int):
+        """Выпустить первое отложенное сообщение чата, когда откроется его слот"""
+        handle = self._timers.pop(chat_id, None)
+        if handle is not None:
+            handle.cancel()
+        delay = max(0.0, self._chat_next.get(chat_id, 0.0) - time.monotonic())
+        self._timers[chat_id] = asyncio.get_running_loop().call_later(delay, self._release, chat_id)
+
+    def _release(self, chat_id: int):
+        self._timers.pop(chat_id, None)
+        waiting = self._deferred.get(chat_id)
+        # Пока предыдущее сообщение чата у Telegram, ждём его исхода (_after_attempt)
+        if not waiting or chat_id in self._sending:
+            return
+        message = waiting.popleft()
+        self._chat_next[chat_id] = time.monotonic() + self.chat_interval
+        self._released[chat_id] = message
+        self._put(message)
+
+    def _after_attempt(self, chat_id: int):
+        """Попытка завершена: следующий отложенный — по слоту чата, пустой чат свободен"""
+        waiting = self._deferred.get(chat_id)
+        if waiting is None or chat_id in self._timers:
+            return
+        if waiting:
+            self._schedule(chat_id)
+        else:
+            del self._deferred[chat_id]
+
+    def _prune_chats(self):
+        """Забыть чаты, чей лимит уже истёк: словарь не растёт со всеми чатами подряд"""
+        now = time.monotonic()
+        if now < self._next_prune:
+            return
+        self._next_prune = now + CHAT_PRUNE_INTERVAL
+        self._chat_next = {
+            chat_id: slot for chat_id, slot in self._chat_next.items()
+            if slot > now or chat_id in self._deferred
+        }
+
+    async def _deliver(self, message: OutgoingMessage):
+        await self._limiter.acquire()
+
+        try:
+            await self._bot.send_message(message.chat_id, message.text, **message.kwargs)
+            self.sent += 1
+            OUTBOX_MESSAGES.labels("sent").inc()
+        except TelegramRetryAfter as e:
+            # Telegram просит подождать — чат закрыт на retry_after, сообщение первым в его очереди
+            self._retry(message, e.retry_after, e)
+        except (TelegramForbiddenError, TelegramBadRequest) as e:
+            self.failed += 1
+            OUTBOX_MESSAGES.labels("failed").inc()
+            logger.error(f"Сообщение в чат {message.chat_id} не доставлено: {e}")
+        except Exception as e:
+            self._retry(message, 2 ** message.attempts, e)
+        else:
+            # Вне try: ошибка обратного вызова не должна приводить к повторной отправке
+            if message.on_sent is not None:
+                message.on_sent()
+
+    def _retry(self, message: OutgoingMessage, delay: float, error: Exception):
+        message.attempts += 1
+        if message.attempts >= self.max_attempts:
+            self.failed += 1
+            OUTBOX_MESSAGES.labels("failed").inc()
+            logger.error(f"Сообщение в чат {message.chat_id} не доставлено после {message.attempts} попыток: {error}")
+            return
+
+        self.retried += 1
+        OUTBOX_MESSAGES.labels("retried").inc()
+        chat_id = message.chat_id
+        self._chat_next[chat_id] = max(self._chat_next.get(chat_id, 0.0), time.monotonic() + delay)
+        self._deferred.setdefault(chat_id, deque()).appendleft(message)
+        self._schedule(chat_id)
+
+
+outbox = TelegramOutbox(OUTBOX_WORKERS, OUTBOX_GLOBAL_RATE, OUTBOX_CHAT_INTERVAL, OUTBOX_MAX_ATTEMPTS)
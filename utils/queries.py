@@ -0,0 +1,96 @@
+from datetime import datetime
+from sqlalchemy import select, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import Request, User, Master
+
+
+def request_rows_stmt(status: str = None):
+    """Заявки с клиентом и мастером одним запросом (Request ⋈ User ⟕ Master)"""
+    stmt = (
+        select(
+            Request.id,
+            Request.service,
+            Request.desired_date,
+            Request.desired_time,
+            Request.pet_name,
+            Request.comment,
+            Request.status,
+            Request.master_id,
+            Request.slot_start,
+            Request.duration_min,
+            Request.created_at,
+            User.tg_user_id,
+            User.first_name,
+            User.phone,
+            Master.name.label("master_name"),
+        )
+        .join(User, User.id == Request.user_id)
+        .outerjoin(Master, Master.id == Request.master_id)
+        .order_by(Request.created_at.desc(), Request.id.desc())
+    )
+
+    if status:
+        stmt = stmt.where(Request.status == status)
+
+    return stmt
+
+
+def encode_cursor(row) -> str:
+    """Курсор keyset-пагинации: (created_at, id) последней строки страницы"""
+    return f"{row.created_at.isoformat()}_{row.id}"
+
+
+def decode_cursor(cursor: str):
+    """Разбор курсора; ValueError при неверном формате"""
+    created_at, _, request_id = cursor.rpartition("_")
+    return datetime.fromisoformat(created_at), int(request_id)
+
+
+def after_cursor(stmt, cursor: str):
+    """Строки строго после курсора в порядке (created_at DESC, id DESC)"""
+    created_at, request_id = decode_cursor(cursor)
+    return stmt.where(or_(
+        Request.created_at < created_at,
+        and_(Request.created_at == created_at, Request.id < request_id)
+    ))
+
+
+def appointments_stmt(start: datetime, end: datetime, status: str = "approved"):
+    """Записи с началом в [start, end) — диапазон по индексу slot_start"""
+    stmt = request_rows_stmt(status).where(
+        Request.slot_start >= start,
+        Request.slot_start < end
+    )
+    return stmt.order_by(None).order_by(Request.slot_start)
+
+
+async def fetch_request_row(session: AsyncSession, request_id: int):
+    """Одна заявка в виде строки проекции (или None)"""
+    stmt = request_rows_stmt().where(Request.id == request_id)
+    result = await session.execute(stmt)
+    return result.first()
+
+
+def request_to_dict(row) -> dict:
+    """Строка проекции → JSON для web-панели"""
+    if row.master_id:
+        master_name = row.master_name or "неизвестно"
+    else:
+        master_name = "не назначен"
+
+    return {
+        "id": row.id,
+        "client": row.first_name or "?",
+        "phone": row.phone or "?",
+        "service": row.service,
+        "date": row.desired_date,
+        "time": row.desired_time,
+        "pet": row.pet_name,
+        "comment": row.comment or "",
+        "status": row.status,
+        "master": master_name,
+        "master_id": row.master_id,
+        "duration_min": row.duration_min,
+        "created_at": row.created_at.strftime("%d.%m.%Y %H:%M") if row.created_at else ""
+    }
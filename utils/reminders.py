@@ -0,0 +1,201 @@
+import asyncio
+import heapq
+import logging
+from functools import partial
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from database import Request, User, ReminderRecord, async_session, read_session, retry_on_locked
+from config import REMINDER_OFFSETS, REMINDER_BATCH
+from utils.catalog import catalog
+from utils.events import event_bus
+from utils.outbox import outbox
+from utils.slots import parse_slot_start
+
+logger = logging.getLogger(__name__)
+
+
+class ReminderScheduler:
+    """Напоминания о записях: куча по времени отправки, отметки об отправке в БД.
+
+    Доставка «хотя бы один раз»: отметка пишется, когда outbox доставил сообщение.
+    Если процесс упал между отправкой и отметкой, после перезапуска напоминание повторится.
+    """
+
+    def __init__(self, offsets: tuple, batch_size: int):
+        self.offsets = tuple(sorted(offsets, reverse=True))  # минуты до записи
+        self.batch_size = batch_size
+        self._heap = []  # (fire_at, request_id, offset, slot_start)
+        self._active = {}  # request_id → slot_start подтверждённой записи
+        self._sent = set()  # (request_id, offset), отправлены или ждут в outbox
+        self._delivered = []  # (request_id, offset), доставлены, отметка ещё не записана
+        self._marks_task = None
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    async def start(self):
+        """Загрузка будущих подтверждённых записей и запуск таймера"""
+        if self._task is not None:
+            return
+
+        now = datetime.now()
+        stmt = select(Request.id, Request.slot_start).where(
+            Request.status == "approved", Request.slot_start > now
+        )
+        async with read_session() as session:
+            rows = (await session.execute(stmt)).all()
+            marks = await session.execute(
+                select(ReminderRecord.request_id, ReminderRecord.offset_min).join(
+                    Request, Request.id == ReminderRecord.request_id
+                ).where(Request.status == "approved", Request.slot_start > now)
+            )
+            self._sent = {(request_id, offset) for request_id, offset in marks}
+
+        for row in rows:
+            # После простоя досылаем одно (самое близкое к записи) пропущенное напоминание
+            self.schedule(row.id, row.slot_start, catch_up=True)
+
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"⏰ Напоминания: {len(self._heap)} в очереди")
+
+    async def stop(self):
+        """Остановить таймер и дописать отметки уже доставленных напоминаний"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._marks_task is not None:
+            await self._marks_task
+
+    def schedule(self, request_id: int, slot_start: datetime, catch_up: bool = False):
+        """Поставить напоминания записи (повторный вызов с тем же временем безопасен)"""
+        now = datetime.now()
+        if slot_start <= now:
+            return
+
+        self._active[request_id] = slot_start
+        overdue = [offset for offset in self.offsets if slot_start - timedelta(minutes=offset) <= now]
+        for offset in self.offsets:
+            if (request_id, offset) in self._sent:
+                continue
+
+            fire_at = slot_start - timedelta(minutes=offset)
+            if fire_at <= now and not (catch_up and offset == min(overdue)):
+                continue
+
+            if not self._heap or fire_at < self._heap[0][0]:
+                self._wakeup.set()
+            heapq.heappush(self._heap, (fire_at, request_id, offset, slot_start))
+
+    def cancel(self, request_id: int):
+        """Записи больше нет: элементы кучи отбросятся при извлечении"""
+        self._active.pop(request_id, None)
+        self._sent = {key for key in self._sent if key[0] != request_id}
+
+    def apply_event(self, event_type: str, payload: dict):
+        """Обработчик шины событий: подтверждение ставит напоминания, остальное снимает"""
+        if self._task is None or event_type not in ("request_created", "status_changed"):
+            return
+
+        request = payload["request"]
+        slot_start = parse_slot_start(request["date"], request["time"])
+        if request["status"] == "approved" and slot_start is not None:
+            if self._active.get(request["id"]) != slot_start:
+                self.cancel(request["id"])
+                self.schedule(request["id"], slot_start)
+        else:
+            self.cancel(request["id"])
+
+    def _pop_due(self, now: datetime) -> list:
+        due = []
+        while self._heap and self._heap[0][0] <= now and len(due) < self.batch_size:
+            fire_at, request_id, offset, slot_start = heapq.heappop(self._heap)
+            if self._active.get(request_id) == slot_start and (request_id, offset) not in self._sent:
+                due.append((request_id, offset))
+        return due
+
+    async def _run(self):
+        """Спим до ближайшего напоминания (или до появления более раннего)"""
+        while True:
+            self._wakeup.clear()
+            delay = (self._heap[0][0] - datetime.now()).total_seconds() if self._heap else None
+            if delay is None or delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            due = self._pop_due(datetime.now())
+            if due:
+                try:
+                    await self.send(due)
+                except Exception as e:
+                    logger.error(f"Ошибка отправки напоминаний: {e}")
+                    retry_at = datetime.now() + timedelta(minutes=1)
+                    for request_id, offset in due:
+                        if request_id in self._active:
+                            heapq.heappush(self._heap, (retry_at, request_id, offset, self._active[request_id]))
+                    await asyncio.sleep(1)
+
+    async def send(self, due: list):
+        """Пачка напоминаний через outbox; отметки пишутся по факту доставки"""
+        stmt = (
+            select(Request.id, Request.service, Request.desired_date, Request.desired_time,
+                   Request.pet_name, User.tg_user_id)
+            .join(User, User.id == Request.user_id)
+            .where(Request.id.in_({request_id for request_id, _ in due}), Request.status == "approved")
+        )
+        async with read_session() as session:
+            rows = {row.id: row for row in await session.execute(stmt)}
+        due = [(request_id, offset) for request_id, offset in due if request_id in rows]
+
+        for request_id, offset in due:
+            self._sent.add((request_id, offset))
+            row = rows[request_id]
+            outbox.send(
+                row.tg_user_id,
+                f"⏰ Напоминаем о записи!\n"
+                f"📅 {row.desired_date}\n"
+                f"⏰ {row.desired_time}\n"
+                f"✂️ {catalog.services.get(row.service, row.service)}\n"
+                f"🐕 {row.pet_name}\n\n"
+                f"Ждём вас! 🐕",
+                on_sent=partial(self._on_delivered, request_id, offset)
+            )
+        if due:
+            logger.info(f"⏰ Отправлено напоминаний: {len(due)}")
+
+    def _on_delivered(self, request_id: int, offset: int):
+        """Колбэк outbox: копим доставленные, пишем отметки в фоне"""
+        self._delivered.append((request_id, offset))
+        if self._marks_task is None:
+            self._marks_task = asyncio.create_task(self._write_marks())
+
+    async def _write_marks(self):
+        """Отметки одним INSERT; пока идёт запись, следующие доставки копятся в новую пачку"""
+        try:
+            while self._delivered:
+                batch, self._delivered = self._delivered, []
+                try:
+                    await self._insert_marks(batch)
+                except Exception as e:
+                    logger.error(f"Ошибка записи отметок напоминаний: {e}")
+        finally:
+            self._marks_task = None
+
+    @retry_on_locked
+    async def _insert_marks(self, batch: list):
+        async with async_session() as session:
+            await session.execute(sqlite_insert(ReminderRecord).on_conflict_do_nothing(), [
+                {"request_id": request_id, "offset_min": offset, "sent_at": datetime.utcnow()}
+                for request_id, offset in batch
+            ])
+            await session.commit()
+
+    def stats(self) -> dict:
+        return {"scheduled": len(self._heap), "active": len(self._active)}
+
+
+reminder_scheduler = ReminderScheduler(REMINDER_OFFSETS, REMINDER_BATCH)
+event_bus.add_listener(reminder_scheduler.apply_event)
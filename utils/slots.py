@@ -0,0 +1,26 @@
+from datetime import datetime, timedelta
+
+from config import DEFAULT_DURATION
+from utils.catalog import catalog
+
+DATE_FORMAT = "%d.%m.%Y"
+TIME_FORMAT = "%H:%M"
+
+
+def parse_slot_start(date_str: str, time_str: str):
+    """ДД.ММ.ГГГГ + ЧЧ:ММ → datetime (или None, если не разбирается)"""
+    try:
+        return datetime.strptime(f"{date_str} {time_str}", f"{DATE_FORMAT} {TIME_FORMAT}")
+    except (TypeError, ValueError):
+        return None
+
+
+def service_duration(service_code: str) -> int:
+    """Длительность услуги в минутах (из каталога)"""
+    return catalog.durations.get(service_code, DEFAULT_DURATION)
+
+
+def day_bounds(day: datetime):
+    """Полуинтервал [начало дня, начало следующего дня)"""
+    start = day.replace(hour=0, minute=0, second=0, microsecond=0)
+    return start, start + timedelta(days=1)
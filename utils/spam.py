@@ -0,0 +1,72 @@
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, func
+
+from database import Request, User, read_session
+from config import SPAM_TIMEOUT
+from utils.metrics import BOOKING_LIMITER_CHECKS, BOOKING_LIMITER_TRACKED
+
+logger = logging.getLogger(__name__)
+
+
+class BookingLimiter:
+    """Анти-спам записи: не чаще одной заявки в окно на Telegram-пользователя"""
+
+    def __init__(self, timeout_min: float):
+        self.window = timeout_min * 60
+        self._last = {}  # tg_user_id → время последней заявки (epoch)
+        self._next_prune = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def is_limited(self, tg_user_id: int) -> bool:
+        """Проверка при нажатии «Записаться» — без обращения к БД"""
+        last = self._last.get(tg_user_id)
+        if last is not None and time.time() - last < self.window:
+            self.hits += 1
+            BOOKING_LIMITER_CHECKS.labels("limited").inc()
+            return True
+
+        self.misses += 1
+        BOOKING_LIMITER_CHECKS.labels("allowed").inc()
+        return False
+
+    def record(self, tg_user_id: int, at: float = None):
+        """Отметить успешно отправленную заявку"""
+        now = time.time()
+        self._last[tg_user_id] = at if at is not None else now
+
+        if now >= self._next_prune:
+            self._prune(now)
+        BOOKING_LIMITER_TRACKED.set(len(self._last))
+
+    def _prune(self, now: float):
+        """Удалить записи, вышедшие из окна (не чаще раза за окно)"""
+        border = now - self.window
+        self._last = {uid: at for uid, at in self._last.items() if at >= border}
+        self._next_prune = now + self.window
+        BOOKING_LIMITER_TRACKED.set(len(self._last))
+
+    async def warm(self):
+        """Заполнить окно из БД при старте (свежие заявки в статусе new)"""
+        since = datetime.utcnow() - timedelta(seconds=self.window)
+        stmt = (
+            select(User.tg_user_id, func.max(Request.created_at))
+            .join(User, User.id == Request.user_id)
+            .where(Request.status == "new", Request.created_at >= since)
+            .group_by(User.tg_user_id)
+        )
+
+        async with read_session() as session:
+            result = await session.execute(stmt)
+            for tg_user_id, created_at in result:
+                self.record(tg_user_id, created_at.replace(tzinfo=timezone.utc).timestamp())
+
+        logger.info(f"🛡 Анти-спам: в окне {len(self._last)} пользователей")
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "tracked": len(self._last)}
+
+
+booking_limiter = BookingLimiter(SPAM_TIMEOUT)
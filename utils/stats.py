@@ -0,0 +1,67 @@
+import asyncio
+import logging
+from sqlalchemy import select, func
+
+from database import Request, read_session
+from utils.events import event_bus
+
+logger = logging.getLogger(__name__)
+
+STATUSES = ("new", "approved", "rejected", "canceled", "completed")
+
+
+class RequestStats:
+    """Счётчики заявок по статусам, обновляемые на каждом переходе"""
+
+    def __init__(self):
+        self.counts = dict.fromkeys(STATUSES, 0)
+
+    def record_created(self, status: str = "new"):
+        """Новая заявка"""
+        self.counts[status] = self.counts.get(status, 0) + 1
+
+    def record_transition(self, old_status: str, new_status: str):
+        """Смена статуса заявки"""
+        if old_status == new_status:
+            return
+        if old_status is not None:
+            self.counts[old_status] = self.counts.get(old_status, 0) - 1
+        self.counts[new_status] = self.counts.get(new_status, 0) + 1
+
+    def apply_event(self, event_type: str, payload: dict):
+        """Обработчик шины событий"""
+        if event_type == "request_created":
+            self.record_created(payload["request"]["status"])
+        elif event_type == "status_changed":
+            self.record_transition(payload["old_status"], payload["status"])
+
+    def snapshot(self) -> dict:
+        """Текущие значения без обращения к БД"""
+        data = dict(self.counts)
+        data["total"] = sum(self.counts.values())
+        return data
+
+    async def reconcile(self):
+        """Сверка счётчиков с таблицей requests"""
+        async with read_session() as session:
+            stmt = select(Request.status, func.count()).group_by(Request.status)
+            result = await session.execute(stmt)
+            counts = dict.fromkeys(STATUSES, 0)
+            counts.update({status: count for status, count in result})
+
+        if counts != self.counts:
+            logger.info(f"📊 Счётчики заявок сверены: {self.counts} → {counts}")
+        self.counts = counts
+
+    async def run_reconciler(self, interval: float):
+        """Периодическая сверка (фоновая задача)"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.reconcile()
+            except Exception as e:
+                logger.error(f"Ошибка сверки статистики: {e}")
+
+
+request_stats = RequestStats()
+event_bus.add_listener(request_stats.apply_event)
@@ -0,0 +1,225 @@
+from datetime import datetime
+from sqlalchemy import select, update, case
+
+from database import Request, User, async_session, retry_on_locked
+from utils.assignment import master_assigner
+from utils.conflicts import SlotConflict, booking_index
+from utils.events import event_bus
+from utils.queries import fetch_request_row, request_rows_stmt, request_to_dict
+from utils.slots import service_duration
+
+
+@retry_on_locked
+async def create_request(user_id: int, phone: str = None, **fields):
+    """Новая заявка (и телефон клиента) одной транзакцией; возвращает строку проекции для карточки"""
+    async with async_session() as session:
+        request = Request(user_id=user_id, status="new", **fields)
+        session.add(request)
+        if phone:
+            await session.execute(update(User).where(User.id == user_id).values(phone=phone))
+        # Строка проекции — в той же транзакции, без второго соединения после commit
+        await session.flush()
+        row = await fetch_request_row(session, request.id)
+        await session.commit()
+
+    await event_bus.publish("request_created", {"request": request_to_dict(row)})
+    return row
+
+
+@retry_on_locked
+async def change_status(request_id: int, status: str, **fields):
+    """Смена статуса заявки; возвращает (строка проекции, старый статус) или (None, None).
+
+    При подтверждении без мастера назначает наименее загруженного подходящего;
+    бросает SlotConflict, если время уже занято.
+    """
+    async with async_session() as session:
+        request = await session.get(Request, request_id)
+
+        if not request:
+            return None, None
+
+        old_status = request.status
+        # Бронь до изменения — чтобы вернуть её в индекс, если commit не состоится
+        old_booking = (request.master_id, request.slot_start, request.duration_min or service_duration(request.service))
+        request.status = status
+        for name, value in fields.items():
+            setattr(request, name, value)
+        request.updated_at = datetime.utcnow()
+
+        # Подтверждение занимает время мастера: SlotConflict, если оно уже занято
+        reserved = status == "approved" and request.slot_start is not None
+        if reserved and request.master_id is None:
+            request.master_id = await master_assigner.pick(
+                request_id, request.service, request.slot_start,
+                request.duration_min or service_duration(request.service)
+            )
+        if reserved:
+            await booking_index.reserve(
+                request_id, request.master_id, request.slot_start,
+                request.duration_min or service_duration(request.service)
+            )
+
+        try:
+            # UPDATE берёт блокировку записи, затем сверка с БД (брони других процессов)
+            await session.flush()
+            if reserved:
+                found = await booking_index.verify(
+                    session, request_id, request.master_id, request.slot_start,
+                    request.duration_min or service_duration(request.service)
+                )
+                if found:
+                    await session.rollback()
+                    raise SlotConflict(found)
+            # Строка проекции — в той же транзакции, без второго соединения после commit
+            row = await fetch_request_row(session, request_id)
+            await session.commit()
+        except Exception:
+            if reserved:
+                booking_index.remove(request_id)
+                if old_status == "approved" and old_booking[1] is not None:
+                    booking_index.add(request_id, *old_booking)
+            raise
+
+    await event_bus.publish("status_changed", {
+        "id": request_id,
+        "old_status": old_status,
+        "status": status,
+        "request": request_to_dict(row)
+    })
+    return row, old_status
+
+
+# Массовые действия панели: действие → новый статус (None — статус не меняется)
+BULK_ACTIONS = {
+    "approve": "approved",
+    "reject": "rejected",
+    "complete": "completed",
+    "assign": None,
+}
+
+# Из каких статусов действие допустимо; остальные заявки — invalid_status
+BULK_SOURCES = {
+    "approve": ("new",),
+    "reject": ("new",),
+    "complete": ("approved",),
+    "assign": ("new", "approved"),
+}
+
+
+@retry_on_locked
+async def bulk_change_status(request_ids: list, action: str, master_id: int = None, comment: str = None):
+    """Одно действие над многими заявками: один SELECT, один UPDATE, одна транзакция.
+
+    Возвращает (результаты по id, изменённые строки проекции).
+    """
+    status = BULK_ACTIONS[action]
+    sources = BULK_SOURCES[action]
+    request_ids = list(dict.fromkeys(request_ids))
+    results = {}
+    masters = {}  # id → мастер после изменения
+    reserved = []
+
+    async with async_session() as session:
+        stmt = select(
+            Request.id, Request.status, Request.master_id, Request.service, Request.slot_start, Request.duration_min
+        ).where(Request.id.in_(request_ids))
+        rows = {row.id: row for row in await session.execute(stmt)}
+
+        for request_id in request_ids:
+            row = rows.get(request_id)
+            if row is None:
+                results[request_id] = {"id": request_id, "result": "not_found"}
+                continue
+            if row.status not in sources:
+                results[request_id] = {"id": request_id, "result": "invalid_status", "status": row.status}
+                continue
+
+            new_status = status or row.status
+            new_master = master_id if master_id is not None else row.master_id
+            length = row.duration_min or service_duration(row.service)
+
+            # Подтверждённые записи проходят ту же проверку пересечений, что и по одной
+            if new_status == "approved" and row.slot_start is not None:
+                if new_master is None:
+                    new_master = await master_assigner.pick(request_id, row.service, row.slot_start, length)
+                try:
+                    await booking_index.reserve(request_id, new_master, row.slot_start, length)
+                except SlotConflict as e:
+                    results[request_id] = {"id": request_id, "result": "conflict", "conflicts": e.request_ids}
+                    continue
+                reserved.append(row)
+
+            masters[request_id] = new_master
+            results[request_id] = {"id": request_id, "result": "ok"}
+
+        changed = []
+        if masters:
+            values = {"updated_at": datetime.utcnow()}
+            if status:
+                values["status"] = status
+            if comment is not None:
+                values["comment"] = comment
+
+            def drop(request_id: int, result: dict):
+                """Заявка выбывает из UPDATE: результат и индекс броней — как до попытки"""
+                results[request_id] = {"id": request_id, **result}
+                del masters[request_id]
+                booking_index.remove(request_id)
+                row = rows[request_id]
+                if row.status == "approved":
+                    booking_index.add(request_id, row.master_id, row.slot_start,
+                                      row.duration_min or service_duration(row.service))
+
+            try:
+                while masters:
+                    # Исходный статус — ещё раз в WHERE: между SELECT и UPDATE его мог сменить другой процесс
+                    updated = set((await session.execute(
+                        update(Request).where(Request.id.in_(masters), Request.status.in_(sources)).values(
+                            **values, master_id=case(masters, value=Request.id, else_=Request.master_id)
+                        ).returning(Request.id).execution_options(synchronize_session=False)
+                    )).scalars())
+                    stale = [request_id for request_id in masters if request_id not in updated]
+                    # Блокировка записи взята — сверяем брони с БД (индексы других процессов могли отстать)
+                    conflicts = {}
+                    for row in reserved:
+                        if row.id not in updated:
+                            continue
+                        found = await booking_index.verify(
+                            session, row.id, masters[row.id], row.slot_start,
+                            row.duration_min or service_duration(row.service)
+                        )
+                        if found:
+                            conflicts[row.id] = found
+                    if not conflicts and not stale:
+                        await session.commit()
+                        break
+
+                    await session.rollback()
+                    for request_id in stale:
+                        drop(request_id, {"result": "invalid_status"})
+                    for request_id, found in conflicts.items():
+                        drop(request_id, {"result": "conflict", "conflicts": found})
+                    reserved = [row for row in reserved if row.id in masters]
+            except Exception:
+                # Возвращаем индекс к состоянию до попытки
+                for row in reserved:
+                    booking_index.remove(row.id)
+                    if row.status == "approved":
+                        booking_index.add(row.id, row.master_id, row.slot_start,
+                                          row.duration_min or service_duration(row.service))
+                raise
+
+            if masters:
+                changed = (await session.execute(request_rows_stmt().where(Request.id.in_(masters)))).all()
+
+    await event_bus.publish_many([
+        ("status_changed", {
+            "id": row.id,
+            "old_status": rows[row.id].status,
+            "status": row.status,
+            "request": request_to_dict(row)
+        })
+        for row in changed
+    ])
+    return [results[request_id] for request_id in request_ids], changed
@@ -1,9 +1,18 @@
 import re
+from collections import namedtuple
 from datetime import datetime
-from sqlalchemy import select
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.asyncio import AsyncSession
-from database import Request, User, async_session
-from config import SPAM_TIMEOUT
+from database import User, async_session, retry_on_locked
+from config import USER_CACHE_SIZE, USER_CACHE_TTL
+from utils.cache import TTLCache
+
+# Что нужно хендлерам о пользователе: users.id, имя и телефон
+UserInfo = namedtuple("UserInfo", ["id", "tg_user_id", "first_name", "phone"])
+
+# tg_user_id → UserInfo
+user_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL)
 
 async def validate_phone(phone: str) -> bool:
     """Проверка формата телефона"""
@@ -29,35 +38,23 @@ async def validate_time(time_str: str) -> bool:
         return False
 
 
-async def check_spam(user_id: int) -> bool:
-    """Проверка спама: есть ли новая заявка меньше N минут назад"""
-    async with async_session() as session:
-        stmt = select(Request).where(
-            Request.user_id == user_id,
-            Request.status == "new"
-        ).order_by(Request.created_at.desc()).limit(1)
-        
-        result = await session.execute(stmt)
-        last_request = result.scalar()
-        
-        if not last_request:
-            return False
-        
-        time_diff = (datetime.utcnow() - last_request.created_at).total_seconds() / 60
-        return time_diff < SPAM_TIMEOUT
-
-
-async def get_or_create_user(tg_user_id: int, first_name: str = None):
-    """Получить или создать пользователя"""
+@retry_on_locked
+async def get_or_create_user(tg_user_id: int, first_name: str = None) -> UserInfo:
+    """Получить или создать пользователя (кэш, иначе один upsert)"""
+    user = user_cache.get(tg_user_id)
+    if user and (first_name is None or user.first_name == first_name):
+        return user
+    
+    stmt = sqlite_insert(User).values(tg_user_id=tg_user_id, first_name=first_name)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[User.tg_user_id],
+        set_={"first_name": func.coalesce(stmt.excluded.first_name, User.first_name)}
+    ).returning(User.id, User.tg_user_id, User.first_name, User.phone)
+    
     async with async_session() as session:
-        stmt = select(User).where(User.tg_user_id == tg_user_id)
         result = await session.execute(stmt)
-        user = result.scalar()
-        
-        if not user:
-            user = User(tg_user_id=tg_user_id, first_name=first_name)
-            session.add(user)
-            await session.commit()
-            await session.refresh(user)
-        
-        return user
+        user = UserInfo(*result.one())
+        await session.commit()
+    
+    user_cache.set(tg_user_id, user)
+    return user
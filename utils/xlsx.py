@@ -0,0 +1,17 @@
+# Без импортов проекта: модуль загружается в процессах пула экспорта
+
+
+def build_xlsx(header: list, rows: list, title: str = "Заявки") -> bytes:
+    """Книга XLSX из готовых строк (выполняется в отдельном процессе)"""
+    from io import BytesIO
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title)
+    sheet.append(header)
+    for row in rows:
+        sheet.append(row)
+
+    buffer = BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
@@ -1,110 +1,362 @@
-from fastapi import FastAPI, Depends, HTTPException, Request
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import FastAPI, Depends, HTTPException, Query, Request as HTTPRequest
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
+from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import BaseModel, Field
+from typing import Dict, List, Literal, Optional
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
+import asyncio
+import json
+import logging
 import os
+import time
 
-from database import async_session, User, Request, Master, ConfigItem, init_db
+from database import async_session, read_session, Master, ConfigItem, init_db
+from utils.queries import request_rows_stmt, request_to_dict, after_cursor, encode_cursor, appointments_stmt
+from utils.slots import DATE_FORMAT, day_bounds
+from utils.assignment import master_assigner
+from utils.availability import DAY_MINUTES, WEEKDAYS, availability
+from utils.catalog import catalog
+from utils.events import event_bus
+from utils import metrics
+from utils.export import ExportTooLarge, export_stmt, stream_csv, export_xlsx, shutdown_pool
+from utils.stats import request_stats
+from utils.conflicts import SlotConflict, booking_index
+from utils.notifications import notify_status
+from utils.transitions import BULK_ACTIONS, change_status, bulk_change_status
+from config import SPECIALTIES, STATS_RECONCILE_INTERVAL
 
-app = FastAPI(title="Grooming Bot Admin Panel")
+logger = logging.getLogger(__name__)
 
 
-async def get_db() -> AsyncSession:
-    """Получить сессию БД"""
-    async with async_session() as session:
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Фоновые задачи панели (в каждом воркере uvicorn)"""
+    await request_stats.reconcile()
+    reconciler = asyncio.create_task(request_stats.run_reconciler(STATS_RECONCILE_INTERVAL))
+    await booking_index.build()
+    await catalog.start()
+    await event_bus.start_relay()
+    try:
+        yield
+    finally:
+        reconciler.cancel()
+        await catalog.stop()
+        shutdown_pool()
+        await event_bus.stop_relay()
+
+
+app = FastAPI(title="Grooming Bot Admin Panel", lifespan=lifespan)
+
+# CORS для web-панели
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+
+@app.middleware("http")
+async def record_metrics(request: HTTPRequest, call_next):
+    """Время ответа и бюджет SQL по шаблону маршрута (/api/requests/{request_id}/approve)"""
+    start = time.perf_counter()
+    with metrics.track(request.method) as scope:
+        response = await call_next(request)
+    route = request.scope.get("route")
+    path = route.path if route else "other"
+    metrics.observe_web(request.method, path, response.status_code, time.perf_counter() - start)
+    scope.name = f"{request.method} {path}"
+    # Тело (NDJSON, CSV) выполняется в контексте эндпоинта и пишет в тот же scope —
+    # бюджет проверяем, когда оно отдано целиком
+    response.body_iterator = _check_budget_after(response.body_iterator, scope)
+    return response
+
+
+async def _check_budget_after(body_iterator, scope):
+    try:
+        async for chunk in body_iterator:
+            yield chunk
+    finally:
+        metrics.check_budget(scope)
+
+# Размер страницы списка заявок
+REQUESTS_PAGE_SIZE = 100
+REQUESTS_PAGE_MAX = 500
+
+# Keep-alive для SSE (секунды)
+SSE_KEEPALIVE = 15
+
+# Какие события шины уходят в панель (notify и служебные — нет)
+SSE_EVENTS = {"request_created", "status_changed", "resync"}
+
+
+async def get_read_db() -> AsyncSession:
+    """Сессия только для чтения (отдельный пул, не мешает записи бота)"""
+    async with read_session() as session:
         yield session
 
 
 # ============= API ENDPOINTS =============
 
 @app.get("/api/requests")
-async def get_requests(status: str = None, db: AsyncSession = Depends(get_db)):
-    """Получить все заявки (с фильтром по статусу)"""
+async def get_requests(
+    http_request: HTTPRequest,
+    status: str = None,
+    limit: int = Query(None, ge=1),
+    after: str = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Заявки страницами по курсору (created_at, id); NDJSON-поток по Accept"""
+    stmt = request_rows_stmt(status)
+    
+    if after:
+        try:
+            stmt = after_cursor(stmt, after)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Неверный курсор")
+    
+    if "application/x-ndjson" in http_request.headers.get("accept", ""):
+        if limit is not None:
+            stmt = stmt.limit(limit)
+        return StreamingResponse(stream_request_rows(stmt), media_type="application/x-ndjson")
+    
+    limit = min(limit or REQUESTS_PAGE_SIZE, REQUESTS_PAGE_MAX)
+    
     try:
-        stmt = select(Request).order_by(Request.created_at.desc())
-        
-        if status:
-            stmt = stmt.where(Request.status == status)
-        
-        result = await db.execute(stmt)
-        requests = result.scalars().all()
-        
-        data = []
-        for req in requests:
-            user_stmt = select(User).where(User.id == req.user_id)
-            user_result = await db.execute(user_stmt)
-            user = user_result.scalar()
-            
-            master_name = "не назначен"
-            if req.master_id:
-                master_stmt = select(Master).where(Master.id == req.master_id)
-                master_result = await db.execute(master_stmt)
-                master = master_result.scalar()
-                master_name = master.name if master else "неизвестно"
-            
-            data.append({
-                "id": req.id,
-                "client": user.first_name if user else "?",
-                "phone": user.phone if user else "?",
-                "service": req.service,
-                "date": req.desired_date,
-                "time": req.desired_time,
-                "pet": req.pet_name,
-                "comment": req.comment or "",
-                "status": req.status,
-                "master": master_name,
-                "created_at": req.created_at.strftime("%d.%m.%Y %H:%M") if req.created_at else ""
-            })
-        
-        return data
+        result = await db.execute(stmt.limit(limit + 1))
+        rows = result.all()
+    except Exception:
+        logger.exception("❌ Ошибка в get_requests")
+        raise HTTPException(status_code=500, detail="Не удалось загрузить заявки")
     
-    except Exception as e:
-        print(f"❌ Ошибка в get_requests: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return {"error": str(e)}
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return {
+        "items": [request_to_dict(row) for row in rows[:limit]],
+        "next_cursor": next_cursor
+    }
+
+
+async def stream_request_rows(stmt):
+    """Построчная выдача из серверного курсора (память не растёт с таблицей)"""
+    async with read_session() as session:
+        result = await session.stream(stmt)
+        async for row in result:
+            yield json.dumps(request_to_dict(row), ensure_ascii=False) + "\n"
+
+
+class BulkAction(BaseModel):
+    ids: List[int]
+    action: Literal["approve", "reject", "complete", "assign"]
+    master_id: Optional[int] = None
+    reason: str = ""
+
+
+@app.post("/api/requests/bulk")
+async def bulk_requests(body: BulkAction, db: AsyncSession = Depends(get_read_db)):
+    """Одно действие над многими заявками; результат по каждому id"""
+    if not body.ids or len(body.ids) > REQUESTS_PAGE_MAX:
+        raise HTTPException(status_code=400, detail=f"От 1 до {REQUESTS_PAGE_MAX} заявок")
+    
+    if body.action == "assign":
+        master = await db.get(Master, body.master_id) if body.master_id else None
+        if not master or not master.is_active:
+            raise HTTPException(status_code=400, detail="Нужен активный мастер (master_id)")
+    
+    comment = None
+    if body.action == "reject":
+        comment = f"[ОТКЛОНЕНО] {body.reason}" if body.reason else "[ОТКЛОНЕНО]"
+    
+    results, changed = await bulk_change_status(body.ids, body.action, master_id=body.master_id, comment=comment)
+    # assign статус не меняет — клиенту писать нечего; остальные действия меняют статус каждой
+    # изменённой строки (исходный статус проверен в bulk_change_status)
+    if BULK_ACTIONS[body.action]:
+        await notify_status(changed)
+    
+    return {"updated": len(changed), "results": results}
+
 
 @app.post("/api/requests/{request_id}/approve")
-async def approve_request(request_id: int, master_id: int = None, db: AsyncSession = Depends(get_db)):
+async def approve_request(request_id: int, master_id: int = None):
     """Подтвердить заявку"""
-    stmt = select(Request).where(Request.id == request_id)
-    result = await db.execute(stmt)
-    request = result.scalar()
+    fields = {"master_id": master_id} if master_id else {}
+    try:
+        row, _ = await change_status(request_id, "approved", **fields)
+    except SlotConflict as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "conflicts": e.request_ids})
     
-    if not request:
+    if not row:
         raise HTTPException(status_code=404, detail="Заявка не найдена")
     
-    request.status = "approved"
-    if master_id:
-        request.master_id = master_id
-    request.updated_at = datetime.utcnow()
-    
-    await db.commit()
     return {"status": "ok", "message": "Заявка подтверждена"}
 
 
 @app.post("/api/requests/{request_id}/reject")
-async def reject_request(request_id: int, reason: str = "", db: AsyncSession = Depends(get_db)):
+async def reject_request(request_id: int, reason: str = ""):
     """Отклонить заявку"""
-    stmt = select(Request).where(Request.id == request_id)
-    result = await db.execute(stmt)
-    request = result.scalar()
+    comment = f"[ОТКЛОНЕНО] {reason}" if reason else "[ОТКЛОНЕНО]"
+    row, _ = await change_status(request_id, "rejected", comment=comment)
     
-    if not request:
+    if not row:
         raise HTTPException(status_code=404, detail="Заявка не найдена")
     
-    request.status = "rejected"
-    request.comment = f"[ОТКЛОНЕНО] {reason}" if reason else "[ОТКЛОНЕНО]"
-    request.updated_at = datetime.utcnow()
-    
-    await db.commit()
     return {"status": "ok", "message": "Заявка отклонена"}
 
 
+@app.get("/api/appointments")
+async def get_appointments(day: str, status: str = "approved", db: AsyncSession = Depends(get_read_db)):
+    """Записи на день ДД.ММ.ГГГГ в порядке времени"""
+    try:
+        start, end = day_bounds(datetime.strptime(day, DATE_FORMAT))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Дата в формате ДД.ММ.ГГГГ")
+    
+    result = await db.execute(appointments_stmt(start, end, status))
+    return [request_to_dict(row) for row in result]
+
+
+@app.post("/api/appointments/replan")
+async def replan_appointments(day: str):
+    """Назначить мастеров всем подтверждённым заявкам дня без мастера"""
+    try:
+        plan_day = datetime.strptime(day, DATE_FORMAT).date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Дата в формате ДД.ММ.ГГГГ")
+    
+    return await master_assigner.replan_day(plan_day)
+
+
+@app.get("/api/export")
+async def export_requests(
+    date_from: str = None,
+    date_to: str = None,
+    status: str = None,
+    format: Literal["csv", "xlsx"] = "csv"
+):
+    """Выгрузка заявок для бухгалтерии (даты записи ДД.ММ.ГГГГ включительно)"""
+    try:
+        start = datetime.strptime(date_from, DATE_FORMAT) if date_from else None
+        end = datetime.strptime(date_to, DATE_FORMAT) if date_to else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Дата в формате ДД.ММ.ГГГГ")
+    
+    stmt = export_stmt(start, end, status)
+    name = f"requests_{date_from or 'all'}_{date_to or 'all'}"
+    
+    if format == "csv":
+        return StreamingResponse(
+            stream_csv(stmt),
+            media_type="text/csv; charset=utf-8",
+            headers={"Content-Disposition": f'attachment; filename="{name}.csv"'}
+        )
+    
+    try:
+        content = await export_xlsx(stmt)
+    except ImportError:
+        raise HTTPException(status_code=501, detail="Для XLSX нужен пакет openpyxl")
+    except ExportTooLarge as e:
+        raise HTTPException(status_code=413, detail=f"Больше {e.limit} строк — выгрузите в CSV или сузьте период")
+    
+    return Response(
+        content,
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers={"Content-Disposition": f'attachment; filename="{name}.xlsx"'}
+    )
+
+
+@app.get("/api/stats")
+async def get_stats():
+    """Количество заявок по статусам (из счётчиков, без запроса к БД)"""
+    return request_stats.snapshot()
+
+
+@app.get("/api/outbox")
+async def get_outbox():
+    """Очередь исходящих сообщений Telegram (outbox процесса бота, через метрики)"""
+    return metrics.outbox_stats()
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Метрики Prometheus (бот, все воркеры панели, БД, Telegram API)"""
+    body, content_type = metrics.render()
+    return Response(body, media_type=content_type)
+
+
+@app.get("/api/events")
+async def stream_events(http_request: HTTPRequest):
+    """SSE-канал событий заявок для панели (вместо опроса)"""
+    queue = event_bus.subscribe()
+    
+    async def stream():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event_type, payload = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                
+                if event_type not in SSE_EVENTS:
+                    continue
+                
+                data = dict(payload, stats=request_stats.snapshot())
+                yield f"event: {event_type}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+        finally:
+            event_bus.unsubscribe(queue)
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/api/catalog")
+async def get_catalog():
+    """Услуги и FAQ с номером версии"""
+    return catalog.snapshot()
+
+
+class ServiceItem(BaseModel):
+    name: str = Field(min_length=1)
+    duration: int = Field(gt=0, le=DAY_MINUTES)  # минуты
+    specialty: Literal[SPECIALTIES]
+
+
+class FAQItem(BaseModel):
+    question: str = Field(min_length=1)
+    answer: str = Field(min_length=1)
+    menu: Optional[str] = None  # подпись кнопки в главном меню
+
+
+@app.put("/api/catalog/services")
+async def set_services(services: Dict[str, ServiceItem]):
+    """Услуги: {"wash": {"name": "🚿 Мытьё (1000 руб)", "duration": 20, "specialty": "мытьё"}, ...}"""
+    if not services:
+        raise HTTPException(status_code=400, detail="Нужна хотя бы одна услуга")
+    
+    version = await catalog.update(services={code: item.model_dump() for code, item in services.items()})
+    return {"status": "ok", "version": version}
+
+
+@app.put("/api/catalog/faq")
+async def set_faq(faq: Dict[str, FAQItem]):
+    """FAQ: {"price": {"question": "...", "answer": "...", "menu": "💰 Прайс"}, ...}"""
+    if not faq:
+        raise HTTPException(status_code=400, detail="Нужен хотя бы один вопрос")
+    
+    version = await catalog.update(faq={code: item.model_dump(exclude_none=True) for code, item in faq.items()})
+    return {"status": "ok", "version": version}
+
+
 @app.get("/api/masters")
-async def get_masters(db: AsyncSession = Depends(get_db)):
+async def get_masters(db: AsyncSession = Depends(get_read_db)):
     """Получить всех мастеров"""
     result = await db.execute(select(Master))
     masters = result.scalars().all()
@@ -123,62 +375,47 @@ async def get_masters(db: AsyncSession = Depends(get_db)):
 
 
 @app.post("/api/masters")
-async def create_master(name: str, specialty: str, phone: str, db: AsyncSession = Depends(get_db)):
+async def create_master(name: str, specialty: str, phone: str):
     """Создать мастера"""
-    master = Master(name=name, specialty=specialty, phone=phone)
-    db.add(master)
-    await db.commit()
-    await db.refresh(master)
+    # Сессия записи закрывается до publish: реле событий пишет через тот же единственный коннект
+    async with async_session() as session:
+        master = Master(name=name, specialty=specialty, phone=phone)
+        session.add(master)
+        await session.commit()
+        master_id = master.id
+    await event_bus.publish("masters_changed", {"id": master_id})
     
-    return {"id": master.id, "name": master.name}
+    return {"id": master_id, "name": name}
 
 
-@app.get("/api/requests")
-async def get_requests(status: str = None, db: AsyncSession = Depends(get_db)):
-    """Получить все заявки (с фильтром по статусу)"""
-    try:
-        stmt = select(Request).order_by(Request.created_at.desc())
-        
-        if status:
-            stmt = stmt.where(Request.status == status)
-        
-        result = await db.execute(stmt)
-        requests = result.scalars().all()
-        
-        data = []
-        for req in requests:
-            user_stmt = select(User).where(User.id == req.user_id)
-            user_result = await db.execute(user_stmt)
-            user = user_result.scalar()
-            
-            master_name = "не назначен"
-            if req.master_id:
-                master_stmt = select(Master).where(Master.id == req.master_id)
-                master_result = await db.execute(master_stmt)
-                master = master_result.scalar()
-                master_name = master.name if master else "неизвестно"
-            
-            data.append({
-                "id": req.id,
-                "client": user.first_name if user else "?",
-                "phone": user.phone if user else "?",
-                "service": req.service,
-                "date": req.desired_date,
-                "time": req.desired_time,
-                "pet": req.pet_name,
-                "comment": req.comment or "",
-                "status": req.status,
-                "master": master_name,
-                "created_at": req.created_at.strftime("%d.%m.%Y %H:%M") if req.created_at else ""
-            })
+@app.put("/api/masters/{master_id}/schedule")
+async def set_master_schedule(master_id: int, schedule: dict):
+    """График мастера: {"пн": ["10:00-14:00", "15:00-20:00"], ...}"""
+    unknown = set(schedule) - set(WEEKDAYS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Неизвестные дни: {', '.join(sorted(unknown))}")
+    
+    async with async_session() as session:
+        master = await session.get(Master, master_id)
+        if not master:
+            raise HTTPException(status_code=404, detail="Мастер не найден")
         
-        return data
+        master.schedule = schedule
+        await session.commit()
+    await event_bus.publish("masters_changed", {"id": master_id})
+    
+    return {"status": "ok", "schedule": schedule}
+
+
+@app.get("/api/slots")
+async def get_slots(day: str, service: str):
+    """Свободное время на день для услуги"""
+    try:
+        slot_day = datetime.strptime(day, DATE_FORMAT).date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Дата в формате ДД.ММ.ГГГГ")
     
-    except Exception as e:
-        print(f"❌ Ошибка в get_requests: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return {"error": str(e)}
+    return {"day": day, "service": service, "slots": await availability.free_slots(slot_day, service)}
 
 
 # ============= HTML PAGES =============
@@ -369,6 +606,14 @@ async def dashboard():
                 font-size: 0.9em;
             }
             
+            .bulk {
+                align-items: center;
+                background: white;
+                padding: 10px 15px;
+                border-radius: 10px;
+                box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+            }
+            
             .loading {
                 text-align: center;
                 padding: 40px;
@@ -417,67 +662,97 @@ async def dashboard():
                 <button class="btn-secondary" onclick="filterStatus('')">📋 Все</button>
             </div>
             
+            <div class="controls bulk" id="bulk" style="display: none;">
+                <span>Выбрано: <b id="bulk-count">0</b></span>
+                <button class="btn-approve" onclick="bulkAction('approve')">✅ Подтвердить</button>
+                <button class="btn-reject" onclick="bulkAction('reject')">❌ Отклонить</button>
+                <button class="btn-secondary" onclick="bulkAction('complete')">✔ Завершить</button>
+                <button class="btn-secondary" onclick="bulkAction('assign')">💇 Назначить мастера</button>
+                <button class="btn-secondary" onclick="clearSelection()">Снять выделение</button>
+            </div>
+            
             <div id="content">
                 <div class="loading">Загрузка...</div>
             </div>
+            
+            <div class="controls" style="justify-content: center; margin-top: 20px;">
+                <button class="btn-secondary" id="more" style="display: none;" onclick="loadMore()">⬇️ Загрузить ещё</button>
+            </div>
         </div>
         
         <script>
             let currentFilter = '';
+            let nextCursor = null;
+            const selected = new Set();
+            
+            function renderStats(data) {
+                document.getElementById('total').textContent = data.total;
+                document.getElementById('new').textContent = data.new;
+                document.getElementById('approved').textContent = data.approved;
+                document.getElementById('completed').textContent = data.completed;
+            }
             
             async function loadStats() {
                 try {
                     const response = await fetch('/api/stats');
-                    const data = await response.json();
-                    
-                    document.getElementById('total').textContent = data.total;
-                    document.getElementById('new').textContent = data.new;
-                    document.getElementById('approved').textContent = data.approved;
-                    document.getElementById('completed').textContent = data.completed;
+                    renderStats(await response.json());
                 } catch (error) {
                     console.error('Ошибка загрузки статистики:', error);
                 }
             }
             
+            function renderRow(req) {
+                const statusClass = `status status-${req.status}`;
+                const checked = selected.has(req.id) ? 'checked' : '';
+                let html = `<tr data-id="${req.id}">`;
+                html += `<td><input type="checkbox" ${checked} onchange="toggleRow(${req.id}, this.checked)"></td>`;
+                html += `<td>${req.id}</td>`;
+                html += `<td>${req.client}</td>`;
+                html += `<td>${req.phone}</td>`;
+                html += `<td>${req.service}</td>`;
+                html += `<td>${req.date}</td>`;
+                html += `<td>${req.time}</td>`;
+                html += `<td>${req.pet}</td>`;
+                html += `<td><span class="${statusClass}">${req.status}</span></td>`;
+                html += `<td class="actions">`;
+                
+                if (req.status === 'new') {
+                    html += `<button class="btn-approve" onclick="approveRequest(${req.id})">✅ Подтв.</button>`;
+                    html += `<button class="btn-reject" onclick="rejectRequest(${req.id})">❌ Отклон.</button>`;
+                } else if (req.status === 'approved') {
+                    html += `<button class="btn-secondary" onclick="completeRequest(${req.id})">✔ Завершить</button>`;
+                }
+                
+                html += `</td></tr>`;
+                return html;
+            }
+            
+            async function fetchPage(cursor) {
+                const params = new URLSearchParams();
+                if (currentFilter) params.set('status', currentFilter);
+                if (cursor) params.set('after', cursor);
+                
+                const response = await fetch(`/api/requests?${params}`);
+                const page = await response.json();
+                nextCursor = page.next_cursor;
+                document.getElementById('more').style.display = nextCursor ? '' : 'none';
+                return page.items;
+            }
+            
             async function loadRequests() {
                 try {
-                    const url = currentFilter 
-                        ? `/api/requests?status=${currentFilter}`
-                        : '/api/requests';
-                    
-                    const response = await fetch(url);
-                    const requests = await response.json();
+                    const requests = await fetchPage(null);
                     
                     let html = '<table><thead><tr>';
+                    html += '<th><input type="checkbox" id="pick-all" onchange="toggleAll(this.checked)"></th>';
                     html += '<th>#</th><th>Клиент</th><th>Телефон</th><th>Услуга</th>';
                     html += '<th>📅 Дата</th><th>⏰ Время</th><th>🐕 Питомец</th>';
-                    html += '<th>Статус</th><th>Действия</th></tr></thead><tbody>';
+                    html += '<th>Статус</th><th>Действия</th></tr></thead><tbody id="rows">';
                     
                     if (requests.length === 0) {
-                        html += '<tr><td colspan="9" style="text-align:center; padding: 40px;">Нет заявок</td></tr>';
+                        html += '<tr><td colspan="10" style="text-align:center; padding: 40px;">Нет заявок</td></tr>';
                     } else {
-                        requests.forEach(req => {
-                            const statusClass = `status status-${req.status}`;
-                            html += `<tr>`;
-                            html += `<td>${req.id}</td>`;
-                            html += `<td>${req.client}</td>`;
-                            html += `<td>${req.phone}</td>`;
-                            html += `<td>${req.service}</td>`;
-                            html += `<td>${req.date}</td>`;
-                            html += `<td>${req.time}</td>`;
-                            html += `<td>${req.pet}</td>`;
-                            html += `<td><span class="${statusClass}">${req.status}</span></td>`;
-                            html += `<td class="actions">`;
-                            
-                            if (req.status === 'new') {
-                                html += `<button class="btn-approve" onclick="approveRequest(${req.id})">✅ Подтв.</button>`;
-                                html += `<button class="btn-reject" onclick="rejectRequest(${req.id})">❌ Отклон.</button>`;
-                            } else if (req.status === 'approved') {
-                                html += `<button class="btn-secondary" onclick="completeRequest(${req.id})">✔ Завершить</button>`;
-                            }
-                            
-                            html += `</td></tr>`;
-                        });
+                        html += requests.map(renderRow).join('');
                     }
                     
                     html += '</tbody></table>';
@@ -488,6 +763,17 @@ async def dashboard():
                 }
             }
             
+            async function loadMore() {
+                if (!nextCursor) return;
+                
+                try {
+                    const requests = await fetchPage(nextCursor);
+                    document.getElementById('rows').insertAdjacentHTML('beforeend', requests.map(renderRow).join(''));
+                } catch (error) {
+                    alert('Ошибка: ' + error.message);
+                }
+            }
+            
             function filterStatus(status) {
                 currentFilter = status;
                 loadRequests();
@@ -503,8 +789,9 @@ async def dashboard():
                     
                     if (response.ok) {
                         alert('✅ Заявка подтверждена');
-                        loadRequests();
-                        loadStats();
+                    } else if (response.status === 409) {
+                        const error = await response.json();
+                        alert('⚠️ Время занято: ' + error.detail.conflicts.map(i => '#' + i).join(', '));
                     }
                 } catch (error) {
                     alert('Ошибка: ' + error.message);
@@ -522,8 +809,6 @@ async def dashboard():
                     
                     if (response.ok) {
                         alert('❌ Заявка отклонена');
-                        loadRequests();
-                        loadStats();
                     }
                 } catch (error) {
                     alert('Ошибка: ' + error.message);
@@ -534,29 +819,144 @@ async def dashboard():
                 if (!confirm('Отметить как завершенное?')) return;
                 
                 try {
-                    const response = await fetch(`/api/requests/${id}/approve`, {
-                        method: 'POST'
-                    });
-                    
-                    if (response.ok) {
+                    const result = await sendBulk({ids: [id], action: 'complete'});
+                    if (result && result.updated) {
                         alert('✔ Заявка завершена');
-                        loadRequests();
-                        loadStats();
                     }
                 } catch (error) {
                     alert('Ошибка: ' + error.message);
                 }
             }
             
-            // Загрузка при открытии страницы
+            function updateBulkBar() {
+                document.getElementById('bulk-count').textContent = selected.size;
+                document.getElementById('bulk').style.display = selected.size ? '' : 'none';
+            }
+            
+            function toggleRow(id, checked) {
+                if (checked) selected.add(id); else selected.delete(id);
+                updateBulkBar();
+            }
+            
+            function toggleAll(checked) {
+                document.querySelectorAll('#rows tr[data-id]').forEach(row => {
+                    const id = Number(row.dataset.id);
+                    row.querySelector('input[type=checkbox]').checked = checked;
+                    if (checked) selected.add(id); else selected.delete(id);
+                });
+                updateBulkBar();
+            }
+            
+            function clearSelection() {
+                selected.clear();
+                document.querySelectorAll('#content input[type=checkbox]').forEach(box => box.checked = false);
+                updateBulkBar();
+            }
+            
+            async function sendBulk(body) {
+                const response = await fetch('/api/requests/bulk', {
+                    method: 'POST',
+                    headers: {'Content-Type': 'application/json'},
+                    body: JSON.stringify(body)
+                });
+                const data = await response.json();
+                if (!response.ok) {
+                    alert('Ошибка: ' + (data.detail || response.status));
+                    return null;
+                }
+                return data;
+            }
+            
+            async function bulkAction(action) {
+                const body = {ids: [...selected], action: action};
+                
+                if (action === 'reject') {
+                    const reason = prompt('Причина отклонения:');
+                    if (reason === null) return;
+                    body.reason = reason;
+                } else if (action === 'assign') {
+                    const masterId = prompt('ID мастера:');
+                    if (!masterId) return;
+                    body.master_id = Number(masterId);
+                } else if (!confirm(`Применить к ${body.ids.length} заявкам?`)) {
+                    return;
+                }
+                
+                try {
+                    const result = await sendBulk(body);
+                    if (!result) return;
+                    
+                    const conflicts = result.results.filter(r => r.result === 'conflict');
+                    const missing = result.results.filter(r => r.result === 'not_found');
+                    let message = `Готово: ${result.updated} из ${body.ids.length}`;
+                    if (conflicts.length) {
+                        message += '\n⚠️ Время занято: ' + conflicts.map(r => `#${r.id} (с ${r.conflicts.map(i => '#' + i).join(', ')})`).join('; ');
+                    }
+                    if (missing.length) {
+                        message += '\n❓ Не найдены: ' + missing.map(r => '#' + r.id).join(', ');
+                    }
+                    alert(message);
+                    
+                    result.results.filter(r => r.result === 'ok').forEach(r => selected.delete(r.id));
+                    updateBulkBar();
+                } catch (error) {
+                    alert('Ошибка: ' + error.message);
+                }
+            }
+            
+            function patchRow(req) {
+                const rows = document.getElementById('rows');
+                if (!rows) return;
+                
+                const row = rows.querySelector(`tr[data-id="${req.id}"]`);
+                const visible = !currentFilter || req.status === currentFilter;
+                
+                if (row && visible) {
+                    row.outerHTML = renderRow(req);
+                } else if (row) {
+                    row.remove();
+                } else if (visible) {
+                    rows.querySelector('tr:not([data-id])')?.remove();
+                    rows.insertAdjacentHTML('afterbegin', renderRow(req));
+                }
+            }
+            
+            function subscribe() {
+                const events = new EventSource('/api/events');
+                let reconnecting = false;
+                
+                events.addEventListener('request_created', (e) => {
+                    const data = JSON.parse(e.data);
+                    patchRow(data.request);
+                    renderStats(data.stats);
+                });
+                
+                events.addEventListener('status_changed', (e) => {
+                    const data = JSON.parse(e.data);
+                    patchRow(data.request);
+                    renderStats(data.stats);
+                });
+                
+                events.addEventListener('resync', () => {
+                    loadStats();
+                    loadRequests();
+                });
+                
+                // После обрыва соединения события могли потеряться
+                events.onerror = () => { reconnecting = true; };
+                events.onopen = () => {
+                    if (reconnecting) {
+                        reconnecting = false;
+                        loadStats();
+                        loadRequests();
+                    }
+                };
+            }
+            
+            // Загрузка при открытии страницы, дальше — только события
             loadStats();
             loadRequests();
-            
-            // Автообновление каждые 10 секунд
-            setInterval(() => {
-                loadStats();
-                loadRequests();
-            }, 10000);
+            subscribe();
         </script>
     </body>
     </html>
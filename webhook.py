@@ -0,0 +1,89 @@
+import asyncio
+import hmac
+import logging
+from contextlib import asynccontextmanager
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from fastapi import APIRouter, FastAPI, HTTPException, Request, Response
+
+from config import WEBHOOK_BASE_URL, WEBHOOK_PATH, WEBHOOK_SECRET
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+# Сколько ждать обновлений, ещё обрабатываемых при остановке (секунды)
+DRAIN_TIMEOUT = 10
+
+
+def build_webhook_router(bot: Bot, dp: Dispatcher, tasks: set) -> APIRouter:
+    """Маршрут приёма обновлений Telegram для FastAPI-приложения; задачи обработки — в tasks"""
+    router = APIRouter()
+
+    async def process(update: Update):
+        try:
+            await dp.feed_update(bot, update)
+        except Exception as e:
+            logger.exception(f"Ошибка обработки обновления {update.update_id}: {e}")
+
+    @router.post(WEBHOOK_PATH, include_in_schema=False)
+    async def telegram_webhook(http_request: Request):
+        """Отвечаем Telegram сразу, обновление обрабатывается в фоне"""
+        # Без настроенного секрета не принимаем ничего (use_webhook в этом случае выбирает polling)
+        token = http_request.headers.get(SECRET_HEADER, "")
+        if not WEBHOOK_SECRET or not hmac.compare_digest(token, WEBHOOK_SECRET):
+            raise HTTPException(status_code=403, detail="Неверный секрет webhook")
+
+        update = Update.model_validate(await http_request.json(), context={"bot": bot})
+        task = asyncio.create_task(process(update))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        return Response(status_code=200)
+
+    return router
+
+
+async def set_webhook(bot: Bot, dp: Dispatcher):
+    """Зарегистрировать webhook в Telegram"""
+    await bot.set_webhook(
+        WEBHOOK_BASE_URL.rstrip("/") + WEBHOOK_PATH,
+        secret_token=WEBHOOK_SECRET,
+        allowed_updates=dp.resolve_used_update_types()
+    )
+    logger.info(f"🪝 Webhook: {WEBHOOK_BASE_URL.rstrip('/')}{WEBHOOK_PATH}")
+
+
+async def drain(tasks: set, timeout: float = DRAIN_TIMEOUT):
+    """Дождаться обработки уже принятых обновлений (их FSM сбрасывается в конце апдейта)"""
+    if not tasks:
+        return
+    _, pending = await asyncio.wait(set(tasks), timeout=timeout)
+    if pending:
+        logger.warning(f"🪝 Не дообработано обновлений при остановке: {len(pending)}")
+
+
+@asynccontextmanager
+async def webhook_lifecycle(bot: Bot, dp: Dispatcher, tasks: set):
+    """Старт и остановка диспетчера при работе через webhook"""
+    await dp.emit_startup(bot=bot, bots=[bot], dispatcher=dp)
+    await set_webhook(bot, dp)
+    try:
+        yield
+    finally:
+        # Сначала хендлеры, потом остановка служб: иначе outbox и хранилище закроются под ними
+        await drain(tasks)
+        await dp.emit_shutdown(bot=bot, bots=[bot], dispatcher=dp)
+
+
+def create_webhook_app(bot: Bot, dp: Dispatcher) -> FastAPI:
+    """Отдельное приложение только с webhook (для процесса бота)"""
+    tasks = set()
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        async with webhook_lifecycle(bot, dp, tasks):
+            yield
+
+    app = FastAPI(lifespan=lifespan, docs_url=None, redoc_url=None, openapi_url=None)
+    app.include_router(build_webhook_router(bot, dp, tasks))
+    return app